@@ -1,5 +1,5 @@
 // Gen IV module sketch for NANO (the original)
-const char Version[] = {"20230205.NANO"};
+const char Version[] = {"20261018.NANO"};
 
 // Digital Pins
 // Pins 2 & 3 are interrupt-driven by Hall Effect sensors.
@@ -16,6 +16,12 @@ unsigned int  nowFrontCount,  prevFrontCount,  deltaFrontCount  = 0u;
 unsigned int  nowRearCount,   prevRearCount,   deltaRearCount   = 0u;
 unsigned long nowFrontMicros, prevFrontMicros, deltaFrontMicros = 0ul;
 unsigned long nowRearMicros,  prevRearMicros,  deltaRearMicros  = 0ul;
+// Pulse timing, for a speed at every sample even when no pulse landed in the window:
+//  the period between the last two pulses (from the ISR), and the age of the last
+//  pulse when the sample was taken. The Linux box bounds the speed by both.
+volatile unsigned long frontPeriodMicros, rearPeriodMicros = 0ul;
+unsigned long nowFrontPeriodMicros, nowRearPeriodMicros = 0ul;
+unsigned long frontPulseAgeMicros,  rearPulseAgeMicros  = 0ul;
 // wheel sensor pins - digital
 const int pinFW = 2; //frontWheelSensorPin
 const int pinRW = 3; //rearWheelSensorPin
@@ -50,6 +56,20 @@ const int pinExhaustGasTemperature = A7; // small diameter white
 int incomingByte = 0;
 char command = 'u';  // unassigned char
 
+// Streaming mode: 's' starts it, 'x' stops it, '1'-'9' set the rate to 10-90 Hz.
+// The board samples on its own clock and sends samplesPerFrame samples a line:
+//   $F,<frame>,<samples>|<micros>,<the d fields>|<micros>,<the d fields>...*<checksum>
+// <frame> counts up (and wraps at 65536) so the reader can tell a frame went missing;
+//  <checksum> is the Fletcher-16 of everything between '$' and '*', as 4 hex digits.
+//  While a frame is open, commands wait for it to close.
+bool streaming = false;
+unsigned long samplePeriodMicros = 50000ul;  // 20 Hz
+const int samplesPerFrame = 4;
+unsigned long nextSampleMicros = 0ul;
+unsigned int frameNumber = 0u;
+int samplesFramed = 0;  // in the open frame
+unsigned int sum1, sum2 = 0u;  // the checksum so far
+
 // Get all the things lined up
 void setup ()
 {
@@ -88,15 +108,20 @@ void setup ()
 
 
 // Interrupt Service Routines for wheel speed sensors. ISRs are as short as possible.
+//  The first period after power-up runs from boot, so it reads slow; that's harmless.
 void frontPulseISR ()
 {
+  unsigned long pulseMicros = micros();
+  frontPeriodMicros = pulseMicros - frontMicros;
   frontCount++;
-  frontMicros = micros();
+  frontMicros = pulseMicros;
 }
 void rearPulseISR ()
 {
+  unsigned long pulseMicros = micros();
+  rearPeriodMicros = pulseMicros - rearMicros;
   rearCount++;
-  rearMicros = micros();
+  rearMicros = pulseMicros;
 }
 
 void resetCounts() {
@@ -129,7 +154,12 @@ void collectReadings() {
   nowFrontMicros = frontMicros;
   nowRearCount   = rearCount;
   nowRearMicros  = rearMicros;
+  nowFrontPeriodMicros = frontPeriodMicros;
+  nowRearPeriodMicros  = rearPeriodMicros;
   interrupts (); // interrupts on again
+  unsigned long sampleMicros = micros();
+  frontPulseAgeMicros = sampleMicros - nowFrontMicros;  // unsigned, so micros() wrapping is fine
+  rearPulseAgeMicros  = sampleMicros - nowRearMicros;
 
   // gather the ADC inputs. The values returned are 0-1023 based on voltage.
   rawRightRideHeight          = analogRead(pinRightRideHeight);
@@ -164,7 +194,11 @@ void printHeader() {
   Serial.print("rawGearPosition");              Serial.print(',');
   Serial.print("rawAirFuelRatio");              Serial.print(',');
   Serial.print("rawManifoldAbsolutePressure");  Serial.print(',');
-  Serial.println("rawExhaustGasTemperature");
+  Serial.print("rawExhaustGasTemperature");     Serial.print(',');
+  Serial.print("frontPeriodMicros");            Serial.print(',');
+  Serial.print("frontPulseAgeMicros");          Serial.print(',');
+  Serial.print("rearPeriodMicros");             Serial.print(',');
+  Serial.println("rearPulseAgeMicros");
 }
 void printOutput () {
   // show we're processing a read
@@ -184,13 +218,92 @@ void printOutput () {
   Serial.print(rawGearPosition);              Serial.print(',');
   Serial.print(rawAirFuelRatio);              Serial.print(',');
   Serial.print(rawManifoldAbsolutePressure);  Serial.print(',');
-  Serial.println(rawExhaustGasTemperature);   // 15 elements total
+  Serial.print(rawExhaustGasTemperature);     Serial.print(',');
+  // the first 15 are what every version sent; the pulse timing follows them
+  Serial.print(nowFrontPeriodMicros);         Serial.print(',');
+  Serial.print(frontPulseAgeMicros);          Serial.print(',');
+  Serial.print(nowRearPeriodMicros);          Serial.print(',');
+  Serial.println(rearPulseAgeMicros);         // 19 elements total
   digitalWrite(ledPin, LOW);
 }
 
+// streaming: the checksum is worked out as the characters go, so no frame is held in memory
+void sendChecked(const char *text) {
+  for (; *text; text++) {
+    sum1 = (sum1 + (unsigned char) *text) % 255;
+    sum2 = (sum2 + sum1) % 255;
+    Serial.write(*text);
+  }
+}
+void sendNumber(unsigned long value) {
+  char digits[11];
+  ultoa(value, digits, 10);
+  sendChecked(digits);
+}
+void streamSample() {
+  unsigned long sampleMicros = micros();
+  collectReadings();
+  if (samplesFramed == 0) {
+    sum1 = 0u;
+    sum2 = 0u;
+    Serial.write('$');
+    sendChecked("F,"); sendNumber(frameNumber); sendChecked(","); sendNumber(samplesPerFrame);
+  }
+  sendChecked("|"); sendNumber(sampleMicros); sendChecked(",");
+  sendNumber(millis());                     sendChecked(",");
+  sendNumber(nowFrontCount);                sendChecked(",");
+  sendNumber(deltaFrontCount);              sendChecked(",");
+  sendNumber(deltaFrontMicros);             sendChecked(",");
+  sendNumber(nowRearCount);                 sendChecked(",");
+  sendNumber(deltaRearCount);               sendChecked(",");
+  sendNumber(deltaRearMicros);              sendChecked(",");
+  sendNumber(rawLeftRideHeight);            sendChecked(",");
+  sendNumber(rawRightRideHeight);           sendChecked(",");
+  sendNumber(rawFuelPressure);              sendChecked(",");
+  sendNumber(rawFuelTemperature);           sendChecked(",");
+  sendNumber(rawGearPosition);              sendChecked(",");
+  sendNumber(rawAirFuelRatio);              sendChecked(",");
+  sendNumber(rawManifoldAbsolutePressure);  sendChecked(",");
+  sendNumber(rawExhaustGasTemperature);     sendChecked(",");
+  sendNumber(nowFrontPeriodMicros);         sendChecked(",");
+  sendNumber(frontPulseAgeMicros);          sendChecked(",");
+  sendNumber(nowRearPeriodMicros);          sendChecked(",");
+  sendNumber(rearPulseAgeMicros);           // the same 19 elements as printOutput()
+  samplesFramed++;
+  if (samplesFramed == samplesPerFrame) {
+    char checksum[5];
+    sprintf(checksum, "%04X", (sum2 << 8) | sum1);
+    Serial.write('*'); Serial.println(checksum);
+    frameNumber++;
+    samplesFramed = 0;
+  }
+}
+void startStreaming() {
+  streaming = true;
+  frameNumber = 0u;  // tells the reader this is a fresh start, not a gap
+  samplesFramed = 0;
+  nextSampleMicros = micros();
+}
+
 // The main() event
 void loop ()
 {
+  if (streaming) {
+    unsigned long nowMicros = micros();
+    if ((long) (nowMicros - nextSampleMicros) >= 0) {
+      digitalWrite(ledPin, HIGH);
+      streamSample();
+      digitalWrite(ledPin, LOW);
+      nextSampleMicros += samplePeriodMicros;
+      if ((long) (nowMicros - nextSampleMicros) >= 0) {
+        nextSampleMicros = nowMicros + samplePeriodMicros;  // fell behind; skip rather than burst
+      }
+    }
+    if (samplesFramed > 0) {
+      return;  // keep the frame whole; commands wait
+    }
+  }
+
   // we check for an incoming command
   if (Serial.available() > 0) {
     command = '?';  // set a non-active value to start
@@ -216,12 +329,23 @@ void loop ()
       case 'z':
         resetCounts();
         break;
+      case 's':
+        startStreaming();
+        break;
+      case 'x':
+        streaming = false;
+        break;
+      case '1': case '2': case '3': case '4': case '5': case '6': case '7': case '8': case '9':
+        samplePeriodMicros = 1000000ul / (10ul * (command - '0'));
+        break;
       default:
-        Serial.print("Send h for header, d for data, v for version, z to zero wheel counts. Received: "); Serial.println(command);
+        Serial.print("Send h for header, d for data, v for version, z to zero wheel counts, s/x to start/stop streaming, 1-9 for 10-90 Hz. Received: "); Serial.println(command);
         break;
     }
   } // the end of the if statement; we come here immediately when there's no incoming serial data
-  delay(100); // pause a tenth of a second; a caller will wait on average 1/2 of that
+  if (!streaming) {
+    delay(100); // pause a tenth of a second; a caller will wait on average 1/2 of that
+  }
 
 }  // end of loop()
 
@@ -1,5 +1,5 @@
 // NANO2 module sketch
-const char Version[] = {"20230205.NANO2"};
+const char Version[] = {"20261018.NANO2"};
 
 // Digital Pins
 // Pin 2 is interrupt-driven by a cam position (Hall Effect) sensor.
@@ -14,6 +14,10 @@ volatile unsigned long camPositionMicros = 0ul;
 // The 'now' variables are written in the ISR, and used with the others outside the ISR.
 unsigned int  nowCamPositionCount,  prevCamPositionCount,  deltaCamPositionCount  = 0u;
 unsigned long nowCamPositionMicros, prevCamPositionMicros, deltaCamPositionMicros = 0ul;
+// Pulse timing, for an rpm at every sample: the period between the last two pulses
+//  (from the ISR), and the age of the last pulse when the sample was taken.
+volatile unsigned long camPeriodMicros = 0ul;
+unsigned long nowCamPeriodMicros, camPulseAgeMicros = 0ul;
 
 // cam position sensor pin - digital
 const int pinCamPosition = 2; 
@@ -35,6 +39,20 @@ const int pinEGT4 = A4;
 int incomingByte = 0;
 char command = 'u';  // unassigned char
 
+// Streaming mode: 's' starts it, 'x' stops it, '1'-'9' set the rate to 10-90 Hz.
+// The board samples on its own clock and sends samplesPerFrame samples a line:
+//   $F,<frame>,<samples>|<micros>,<the d fields>|<micros>,<the d fields>...*<checksum>
+// <frame> counts up (and wraps at 65536) so the reader can tell a frame went missing;
+//  <checksum> is the Fletcher-16 of everything between '$' and '*', as 4 hex digits.
+//  While a frame is open, commands wait for it to close.
+bool streaming = false;
+unsigned long samplePeriodMicros = 50000ul;  // 20 Hz
+const int samplesPerFrame = 4;
+unsigned long nextSampleMicros = 0ul;
+unsigned int frameNumber = 0u;
+int samplesFramed = 0;  // in the open frame
+unsigned int sum1, sum2 = 0u;  // the checksum so far
+
 // Get all the things lined up
 void setup ()
 {
@@ -72,10 +90,13 @@ void setup ()
 
 // Interrupt Service Routines for hall effect sensors. ISRs are as short as possible.
 //  cam count is 1/2 crank count, the rPi must handle that
+//  The first period after power-up runs from boot, so it reads slow; that's harmless.
 void camPulseISR ()
 {
+  unsigned long pulseMicros = micros();
+  camPeriodMicros = pulseMicros - camPositionMicros;
   camPositionCount++;
-  camPositionMicros = micros();
+  camPositionMicros = pulseMicros;
 }
 
 void resetCounts() {
@@ -101,7 +122,9 @@ void collectReadings() {
   noInterrupts ();  // don't allow changes while we read the volatiles
   nowCamPositionCount  = camPositionCount;
   nowCamPositionMicros = camPositionMicros;
+  nowCamPeriodMicros   = camPeriodMicros;
   interrupts (); // interrupts on again
+  camPulseAgeMicros = micros() - nowCamPositionMicros;  // unsigned, so micros() wrapping is fine
   // gotta do some calcs on the data we pulled
   updateCamPositionValues();
   
@@ -124,7 +147,9 @@ void printHeader() {
   Serial.print("rawEGT1");                Serial.print(',');
   Serial.print("rawEGT2");                Serial.print(',');
   Serial.print("rawEGT3");                Serial.print(',');
-  Serial.println("rawEGT4");            
+  Serial.print("rawEGT4");                Serial.print(',');
+  Serial.print("camPeriodMicros");        Serial.print(',');
+  Serial.println("camPulseAgeMicros");
 }
 void printOutput () {
   // show we're processing a read
@@ -137,13 +162,81 @@ void printOutput () {
   Serial.print(rawEGT1);                Serial.print(',');
   Serial.print(rawEGT2);                Serial.print(',');
   Serial.print(rawEGT3);                Serial.print(',');
-  Serial.println(rawEGT4);              // 8 elements total
+  Serial.print(rawEGT4);                Serial.print(',');
+  // the first 8 are what every version sent; the pulse timing follows them
+  Serial.print(nowCamPeriodMicros);     Serial.print(',');
+  Serial.println(camPulseAgeMicros);    // 10 elements total
   digitalWrite(ledPin, LOW);
 }
 
+// streaming: the checksum is worked out as the characters go, so no frame is held in memory
+void sendChecked(const char *text) {
+  for (; *text; text++) {
+    sum1 = (sum1 + (unsigned char) *text) % 255;
+    sum2 = (sum2 + sum1) % 255;
+    Serial.write(*text);
+  }
+}
+void sendNumber(unsigned long value) {
+  char digits[11];
+  ultoa(value, digits, 10);
+  sendChecked(digits);
+}
+void streamSample() {
+  unsigned long sampleMicros = micros();
+  collectReadings();
+  if (samplesFramed == 0) {
+    sum1 = 0u;
+    sum2 = 0u;
+    Serial.write('$');
+    sendChecked("F,"); sendNumber(frameNumber); sendChecked(","); sendNumber(samplesPerFrame);
+  }
+  sendChecked("|"); sendNumber(sampleMicros); sendChecked(",");
+  sendNumber(millis());               sendChecked(",");
+  sendNumber(nowCamPositionCount);    sendChecked(",");
+  sendNumber(deltaCamPositionCount);  sendChecked(",");
+  sendNumber(deltaCamPositionMicros); sendChecked(",");
+  sendNumber(rawEGT1);                sendChecked(",");
+  sendNumber(rawEGT2);                sendChecked(",");
+  sendNumber(rawEGT3);                sendChecked(",");
+  sendNumber(rawEGT4);                sendChecked(",");
+  sendNumber(nowCamPeriodMicros);     sendChecked(",");
+  sendNumber(camPulseAgeMicros);      // the same 10 elements as printOutput()
+  samplesFramed++;
+  if (samplesFramed == samplesPerFrame) {
+    char checksum[5];
+    sprintf(checksum, "%04X", (sum2 << 8) | sum1);
+    Serial.write('*'); Serial.println(checksum);
+    frameNumber++;
+    samplesFramed = 0;
+  }
+}
+void startStreaming() {
+  streaming = true;
+  frameNumber = 0u;  // tells the reader this is a fresh start, not a gap
+  samplesFramed = 0;
+  nextSampleMicros = micros();
+}
+
 // The main() event
 void loop ()
 {
+  if (streaming) {
+    unsigned long nowMicros = micros();
+    if ((long) (nowMicros - nextSampleMicros) >= 0) {
+      digitalWrite(ledPin, HIGH);
+      streamSample();
+      digitalWrite(ledPin, LOW);
+      nextSampleMicros += samplePeriodMicros;
+      if ((long) (nowMicros - nextSampleMicros) >= 0) {
+        nextSampleMicros = nowMicros + samplePeriodMicros;  // fell behind; skip rather than burst
+      }
+    }
+    if (samplesFramed > 0) {
+      return;  // keep the frame whole; commands wait
+    }
+  }
+
   // we check for an incoming command
   if (Serial.available() > 0) {
     command = '?';  // set a non-active value to start
@@ -169,12 +262,23 @@ void loop ()
       case 'z':
         resetCounts();
         break;
+      case 's':
+        startStreaming();
+        break;
+      case 'x':
+        streaming = false;
+        break;
+      case '1': case '2': case '3': case '4': case '5': case '6': case '7': case '8': case '9':
+        samplePeriodMicros = 1000000ul / (10ul * (command - '0'));
+        break;
       default:
-        Serial.print("Send h for header, d for data, v for version, z to zero cam position count. Received: "); Serial.println(command);
+        Serial.print("Send h for header, d for data, v for version, z to zero cam position count, s/x to start/stop streaming, 1-9 for 10-90 Hz. Received: "); Serial.println(command);
         break;
     }
   } // the end of the if statement; we come here immediately when there's no incoming serial data
-  delay(100); // pause a tenth of a second; a caller will wait on average 1/2 of that
+  if (!streaming) {
+    delay(100); // pause a tenth of a second; a caller will wait on average 1/2 of that
+  }
 
 }  // end of loop()
 
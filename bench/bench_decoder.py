@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+
+# Decoder throughput: the original per-line loop (Decoder.py as of 2022, each
+#  converter called for each field of each line) against the columnar
+#  decode_file(). Checks that the batch gives the same bytes as today's per-line
+#  get_readings(), then prints lines/sec for all three.
+#  usage: bench_decoder.py [raw-file | line-count]
+import io
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bin'))
+import Decoder
+
+header = ('timestamp,millis,frontCount,deltaFrontCount,deltaFrontMicros,rearCount,deltaRearCount,'
+          'deltaRearMicros,rawLeftRideHeight,rawRightRideHeight,rawFuelPressure,rawFuelTemperature,'
+          'rawGearPosition,rawAirFuelRatio,rawManifoldAbsolutePressure,rawExhaustGasTemperature,'
+          'millis,camPositionCount,deltaCamPositionCount,deltaCamPositionMicros,'
+          'rawEGT1,rawEGT2,rawEGT3,rawEGT4,latitude,longitude,altitudeFt,mph,utc')
+
+
+# a plausible session at 4 Hz, with the odd junk line the serial ports produce.
+#  Analog channels wander slowly, the way real sensors do between samples.
+def synthetic_raw_log(line_count):
+    rng = random.Random(42)
+    lines = [header]
+    analog = [rng.randint(100, 900) for _ in range(12)]
+    epoch = 1527436542.799
+    millis = millis2 = 1000
+    front = rear = cam = 0
+    for i in range(line_count):
+        epoch += 0.25
+        millis += 250
+        millis2 += 250
+        dfront = rng.randint(0, 6)
+        drear = rng.randint(0, 6)
+        dcam = rng.randint(0, 40)
+        front = (front + dfront) % 65536  # arduino unsigned ints wrap
+        rear = (rear + drear) % 65536
+        cam = (cam + dcam) % 65536
+        analog = [min(1023, max(0, v + rng.randint(-3, 3))) for v in analog]
+        nano = [millis, front, dfront, rng.randint(200000, 260000) if dfront else 0,
+                rear, drear, rng.randint(200000, 260000) if drear else 0] + analog[:8]
+        nano2 = [millis2, cam, dcam, rng.randint(200000, 260000) if dcam else 0] + analog[8:]
+        gps = [str(37 + rng.random()), str(-122 - rng.random()),
+               str(rng.randint(0, 300)), str(rng.randint(0, 90)), '2018-05-27T15:55:43.000Z']
+        line = '%.3f,' % epoch + ','.join(str(v) for v in nano + nano2) + ',' + ','.join(gps)
+        if i % 997 == 0:
+            line = line[:len(line) // 2]  # a mis-framed read
+        lines.append(line)
+    return '\n'.join(lines) + '\n'
+
+
+# the 2022 get_readings(), kept as it was apart from reading only the first 29
+#  fields, so that logs with pulse timing go through it too
+def original_readings(raw_data):
+    mph = fRpm = rRpm = afr = man = ft = fp = lrh = rrh = utc = '0'
+    rpm = egt1 = egt2 = egt3 = egt4 = '0'
+    try:
+        (timestamp, millis,
+         frontCount, deltaFrontCount, deltaFrontMicros,
+         rearCount, deltaRearCount, deltaRearMicros,
+         rawLeftRideHeight, rawRightRideHeight,
+         rawFuelPressure, rawFuelTemperature,
+         rawGearPosition, rawAirFuelRatio,
+         rawManifoldAbsolutePressure, rawExhaustGasTemperature,
+         millis2,
+         camPositionCount, deltaCamPositionCount, deltaCamPositionMicros,
+         rawEGT1, rawEGT2, rawEGT3, rawEGT4,
+         lat, lon, alt, mph, utc) = raw_data.split(',')[:Decoder.raw_field_count]
+
+        fRpm = Decoder.get_axle_rpm(int(deltaFrontCount), int(deltaFrontMicros))
+        rRpm = Decoder.get_axle_rpm(int(deltaRearCount), int(deltaRearMicros))
+        afr = Decoder.get_afr(int(rawAirFuelRatio))
+        man = Decoder.get_map(int(rawManifoldAbsolutePressure))
+        ft = Decoder.get_fuel_temperature(int(rawFuelTemperature))
+        fp = Decoder.get_fuel_pressure(int(rawFuelPressure))
+        lrh = Decoder.get_ride_height(int(rawLeftRideHeight))
+        rrh = Decoder.get_ride_height(int(rawRightRideHeight))
+        rpm = Decoder.get_engine_rpm(int(deltaCamPositionCount), int(deltaCamPositionMicros))
+        egt1 = Decoder.get_egt(int(rawEGT1))
+        egt2 = Decoder.get_egt(int(rawEGT2))
+        egt3 = Decoder.get_egt(int(rawEGT3))
+        egt4 = Decoder.get_egt(int(rawEGT4))
+    except Exception as e:
+        print("exception in Decode:get_readings: " + str(e))
+        print("RawData: " + raw_data)
+
+    return (mph + ',' + fRpm + ',' + rRpm + ','
+            + afr + ',' + man + ','
+            + ft + ',' + fp + ','
+            + lrh + ',' + rrh + ','
+            + utc + ',' + rpm + ','
+            + egt1 + ',' + egt2 + ','
+            + egt3 + ',' + egt4
+            )
+
+
+def original(raw_text):
+    out = io.StringIO()
+    out.write(Decoder.data_header + '\n')
+    for line in io.StringIO(raw_text):
+        if line.startswith('1'):  # all epoch times will
+            out.write(original_readings(line.rstrip()) + '\n')
+    return out.getvalue()
+
+
+def per_line(raw_text):
+    out = io.StringIO()
+    out.write(Decoder.data_header + '\n')
+    for line in io.StringIO(raw_text):
+        if line.startswith('1'):
+            out.write(Decoder.get_readings(line.rstrip()) + '\n')
+    return out.getvalue()
+
+
+def batch(raw_text):
+    out = io.StringIO()
+    Decoder.decode_file(io.StringIO(raw_text), out)
+    return out.getvalue()
+
+
+def timed(decode, raw_text):
+    start = time.perf_counter()
+    result = decode(raw_text)
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    arg = sys.argv[1] if len(sys.argv) > 1 else '40000'
+    if os.path.isfile(arg):
+        with open(arg) as f:
+            raw_text = f.read()
+    else:
+        raw_text = synthetic_raw_log(int(arg))
+    line_count = sum(1 for line in io.StringIO(raw_text) if line.startswith('1'))
+
+    # get_readings() prints about junk lines; keep the report readable
+    real_stdout = sys.stdout
+    sys.stdout = io.StringIO()
+    (_, original_secs) = timed(original, raw_text)
+    (reference, per_line_secs) = timed(per_line, raw_text)
+    (after, after_secs) = timed(batch, raw_text)
+    sys.stdout = real_stdout
+
+    print('lines:     ' + str(line_count))
+    print('original:  %10.0f lines/sec' % (line_count / original_secs))
+    print('per-line:  %10.0f lines/sec' % (line_count / per_line_secs))
+    print('batch:     %10.0f lines/sec' % (line_count / after_secs))
+    print('speedup:   %10.2fx' % (original_secs / after_secs))
+    print('identical: ' + str(reference == after))
+    if reference != after:
+        sys.exit(1)
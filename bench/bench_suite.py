@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+
+# The whole pipeline without the car: PickleRecorder against simulator.py's
+#  boards, Decoder on a synthetic session, and PickleDisplay's live frame.
+#  Each run is appended to results.jsonl with the commit it ran on, and
+#  compared with the last run on this machine.
+#  usage: bench_suite.py [seconds [raw-file]]
+import subprocess
+import platform
+import signal
+import json
+import io
+import sys
+import os
+import time
+
+bench_dir = os.path.dirname(os.path.abspath(__file__))
+bin_dir = os.path.join(bench_dir, '..', 'bin')
+sys.path.insert(0, bench_dir)
+sys.path.insert(0, bin_dir)
+import bench_decoder
+import simulator
+import SharedRecord
+import Decoder
+
+results_file = os.path.join(bench_dir, 'results.jsonl')
+sim_dir = '/tmp/pickle-bench'
+recorder_seconds = 20
+recorder_hz = 4
+decoder_lines = 40000
+display_frames = 200
+
+
+def percentile(ordered, percent):  # nearest rank
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100.0))]
+
+
+def commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=bench_dir,
+                                       stderr=subprocess.DEVNULL).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+# samples/second and tick jitter, from the raw log the recorder wrote
+def bench_recorder(seconds, raw_log_path):
+    simulation = simulator.start(raw_log_path, sim_dir)
+    try:
+        data_dir = simulation['env']['PICKLE_DATA_DIR']
+        for f in os.listdir(data_dir):
+            if f.startswith('raw-'):  # and their .idx
+                os.remove(os.path.join(data_dir, f))
+        open(os.path.join(data_dir, 'live_readings'), 'w').close()  # log every sample, moving or not
+        env = dict(os.environ)
+        env.update(simulation['env'])
+        recorder = subprocess.Popen([sys.executable, os.path.join(bin_dir, 'PickleRecorder.py'), str(recorder_hz)],
+                                    env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        time.sleep(seconds)
+        if recorder.poll() is not None:
+            return {'error': recorder.stdout.read().decode('ascii', 'replace').strip().splitlines()[-1]}
+        recorder.send_signal(signal.SIGINT)  # the recorder closes its log on Ctrl-C
+        recorder.communicate(timeout=10)
+        with open(os.path.join(simulation['env']['PICKLE_RAMDISK'], 'RECORDER_STATS')) as f:
+            stats = json.load(f)
+        with open(Decoder.find_raw_files(data_dir)[-1]) as f:
+            stamps = [float(line.split(',')[0]) for line in f if line.startswith('1')]
+    finally:
+        simulator.stop(simulation)
+    period_ms = 1000.0 / recorder_hz
+    jitter = sorted(abs((b - a) * 1000 - period_ms) for (a, b) in zip(stamps, stamps[1:]))
+    return {'samples_per_sec': round((len(stamps) - 1) / (stamps[-1] - stamps[0]), 2),
+            'target_hz': recorder_hz,
+            'jitter_ms_p50': round(percentile(jitter, 50), 1),
+            'jitter_ms_p95': round(percentile(jitter, 95), 1),
+            'jitter_ms_max': round(jitter[-1], 1),
+            'serial_ms_mean': stats['serial_ms_mean'],
+            'dropped_ticks': stats['dropped_ticks'],
+            'overruns': stats['overruns']}
+
+
+def bench_decoder_speed():
+    raw_text = bench_decoder.synthetic_raw_log(decoder_lines)
+    line_count = sum(1 for line in io.StringIO(raw_text) if line.startswith('1'))
+    real_stdout = sys.stdout
+    sys.stdout = io.StringIO()  # get_readings() prints about junk lines
+    try:
+        (result, original_secs) = bench_decoder.timed(bench_decoder.original, raw_text)
+        (result, per_line_secs) = bench_decoder.timed(bench_decoder.per_line, raw_text)
+        (result, batch_secs) = bench_decoder.timed(bench_decoder.batch, raw_text)
+    finally:
+        sys.stdout = real_stdout
+    return {'original_lines_per_sec': round(line_count / original_secs),
+            'per_line_lines_per_sec': round(line_count / per_line_secs),
+            'batch_lines_per_sec': round(line_count / batch_secs)}
+
+
+# the time to take a new sample from LIVE.shm to the screen, on SDL's dummy driver,
+#  and from importing the display to its first frame (the options screen)
+def bench_display():
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    os.environ['PICKLE_RAMDISK'] = sim_dir
+    if not os.path.isdir(sim_dir):
+        os.makedirs(sim_dir)
+    start = time.perf_counter()
+    try:
+        import PickleDisplay
+    except ImportError as e:
+        return {'error': str(e)}
+    live = SharedRecord.create(PickleDisplay.live_shm, 1024)
+    lines = bench_decoder.synthetic_raw_log(display_frames + 10).splitlines()[1:]
+    lines = [line for line in lines if line.count(',') >= 28][:display_frames]
+    real_stdout = sys.stdout
+    sys.stdout = io.StringIO()
+    try:
+        PickleDisplay.init_display()
+        first_frame = (time.perf_counter() - start) * 1000
+        PickleDisplay.show_live_reading()  # the first live frame paints the whole screen
+        frames = []
+        for line in lines:
+            SharedRecord.publish(live, line.encode('ascii'))
+            start = time.perf_counter()
+            PickleDisplay.show_live_reading()
+            frames.append((time.perf_counter() - start) * 1000)
+    finally:
+        sys.stdout = real_stdout
+    frames.sort()
+    return {'first_frame_ms': round(first_frame, 1),
+            'frame_ms_mean': round(sum(frames) / len(frames), 3),
+            'frame_ms_p95': round(percentile(frames, 95), 3)}
+
+
+def last_result(host):
+    if not os.path.isfile(results_file):
+        return None
+    last = None
+    with open(results_file) as f:
+        for line in f:
+            result = json.loads(line)
+            if result['host'] == host:
+                last = result
+    return last
+
+
+def report(result, before):
+    for section in ('recorder', 'decoder', 'display'):
+        for (name, value) in sorted(result[section].items()):
+            line = '%-9s %-24s %s' % (section, name, value)
+            if before and isinstance(value, (int, float)) and isinstance(before[section].get(name), (int, float)):
+                line += '   (was %s at %s)' % (before[section][name], before['commit'])
+            print(line)
+
+
+if __name__ == "__main__":
+    seconds = recorder_seconds
+    if len(sys.argv) > 1:
+        seconds = float(sys.argv[1])
+    raw_log_path = sys.argv[2] if len(sys.argv) > 2 else None
+    result = {'commit': commit(), 'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'host': platform.node(), 'python': platform.python_version()}
+    try:
+        result['recorder'] = bench_recorder(seconds, raw_log_path)
+    except Exception as e:
+        result['recorder'] = {'error': str(e)}
+    result['decoder'] = bench_decoder_speed()
+    try:
+        result['display'] = bench_display()
+    except Exception as e:
+        result['display'] = {'error': str(e)}
+    before = last_result(result['host'])
+    report(result, before)
+    with open(results_file, 'a') as f:
+        f.write(json.dumps(result, sort_keys=True) + '\n')
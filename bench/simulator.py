@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+
+# Stands in for the car, so PickleRecorder and PickleDisplay run on any Linux
+#  box: both arduino sketches on pseudo-terminals, and the gps position PickleGPS
+#  would publish.
+# The boards answer the sketches' commands (h header, d data, v version, z zero
+#  the counts) and, like the sketches, only look for one once per delay(100).
+#  They stream too (s start, x stop, 1-9 for 10-90 Hz), in Frames.py's frames.
+#  Samples come from a recorded raw log, replayed round and round, or from
+#  bench_decoder's synthetic session. unplug() and replug() pull a board's usb
+#  cable out and put it back (on a new pseudo-terminal, behind the same link).
+#  usage: simulator.py [raw-file] [sim_dir]
+#   then: PICKLE_NANO_DEV=<sim_dir>/NANO PICKLE_NANO2_DEV=<sim_dir>/NANO2
+#         PICKLE_RAMDISK=<sim_dir> PICKLE_DATA_DIR=<sim_dir>/data PickleRecorder.py
+import threading
+import time
+import tty
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bin'))
+import bench_decoder
+import SharedRecord
+import Frames
+
+sim_dir = '/tmp/pickle-sim'
+sketch_delay = 0.1     # the sketches' delay(100)
+position_period = 1.0  # gpsd reports once a second
+synthetic_lines = 4000
+samples_per_frame = 4  # as the sketches send them
+# where each board's fields sit in a raw line: timestamp, NANO(15), NANO2(8), gps(5),
+#  skew, then the pulse timing NANO(4) and NANO2(2) that newer sketches send
+nano_fields = (1, 16)
+nano2_fields = (16, 24)
+gps_fields = (24, 29)
+nano_pulse_fields = (30, 34)
+nano2_pulse_fields = (34, 36)
+fix_fields = (36, 41)  # the gps fix quality, in logs recorded since PickleGPS sent it
+
+
+# the raw log's header and its whole sample lines, as lists of fields
+def load_raw_log(path):
+    if path is None:
+        lines = bench_decoder.synthetic_raw_log(synthetic_lines).splitlines()
+    elif path.endswith('.bin'):
+        import RawLog
+        lines = [line.rstrip('\n') for line in RawLog.read_lines(path)]
+    else:
+        with open(path) as f:
+            lines = f.read().splitlines()
+    header = lines[0].split(',')
+    rows = [line.split(',') for line in lines[1:] if line.startswith('1')]
+    rows = [fields for fields in rows if len(fields) >= gps_fields[1]]
+    if not rows:
+        raise ValueError('no whole sample lines to replay')
+    return (header, rows)
+
+
+# a log recorded with pulse timing is replayed with it; any other, like an older sketch
+def new_board(name, version, fields, pulse_fields, header, rows):
+    plugged = (name, version, fields, pulse_fields, header, rows)  # for replug()
+    (master, slave) = os.openpty()
+    tty.setraw(slave)  # no echo, no newline translation: a plain byte pipe like the usb serial
+    os.set_blocking(master, False)
+    link = os.path.join(sim_dir, name)
+    if os.path.lexists(link):
+        os.remove(link)
+    os.symlink(os.ttyname(slave), link)
+    if len(header) < pulse_fields[1] or not all(row[pulse_fields[0]] for row in rows[:10]):
+        pulse_fields = (0, 0)
+    names = header[fields[0]:fields[1]] + header[pulse_fields[0]:pulse_fields[1]]
+    return {'name': name, 'version': version, 'master': master, 'slave': slave, 'link': link,
+            'header': ','.join(names), 'rows': rows, 'fields': fields, 'pulse_fields': pulse_fields,
+            'next': 0, 'commands': 0, 'streaming': False, 'period': 0.05, 'frame': 0,
+            'plugged': plugged, 'unplugged': threading.Event()}
+
+
+def next_fields(board):
+    row = board['rows'][board['next'] % len(board['rows'])]
+    board['next'] += 1
+    (first, end) = board['fields']
+    (pulse_first, pulse_end) = board['pulse_fields']
+    return ','.join(row[first:end] + row[pulse_first:pulse_end])
+
+
+def reply(board, command):  # the answer to a command, or None for none
+    if command == b'd':
+        return next_fields(board)
+    if command == b'h':
+        return board['header']
+    if command == b'v':
+        return 'Version: ' + board['version']
+    if command == b'z':
+        return 'Wheel counts reset.'
+    if command == b's':
+        (board['streaming'], board['frame']) = (True, 0)
+        return None
+    if command == b'x':
+        board['streaming'] = False
+        return None
+    if command in b'123456789':
+        board['period'] = 1.0 / (10 * int(command))
+        return None
+    return ('Send h for header, d for data, v for version, z to zero wheel counts. Received: ' +
+            command.decode('ascii', 'replace'))
+
+
+# the sketch's loop(): take a sample when streaming and one is due, and while
+#  no frame is open, take everything waiting and act on the last command;
+#  delay(100) only when not streaming
+def run_board(board, stop):
+    os.write(board['master'], b'Starting setup... Finished setup.\r\n')
+    framed = []
+    next_sample = time.monotonic()
+    while not stop.is_set() and not board['unplugged'].is_set():
+        if board['streaming']:
+            now = time.monotonic()
+            if now >= next_sample:
+                framed.append((int(now * 1000000), next_fields(board)))
+                next_sample = max(next_sample + board['period'], now)
+                if len(framed) == samples_per_frame:
+                    os.write(board['master'], Frames.encode_frame(board['frame'], framed))
+                    board['frame'] += 1
+                    framed = []
+            if framed:
+                time.sleep(max(next_sample - time.monotonic(), 0))
+                continue
+        try:
+            incoming = os.read(board['master'], 1024).replace(b'\n', b'')
+        except (BlockingIOError, OSError):
+            incoming = b''
+        if incoming:
+            board['commands'] += 1
+            was_streaming = board['streaming']
+            answer = reply(board, incoming[-1:])
+            if answer is not None:
+                os.write(board['master'], answer.encode('ascii') + b'\r\n')  # println
+            if board['streaming'] and not was_streaming:
+                next_sample = time.monotonic()
+        if board['streaming']:
+            time.sleep(max(min(next_sample - time.monotonic(), sketch_delay), 0))
+        else:
+            time.sleep(sketch_delay)
+
+
+# what PickleGPS writes: the POSITION file and the POSITION.shm record
+def run_position(rows, stop):
+    position_shm = SharedRecord.create(os.path.join(sim_dir, 'POSITION.shm'))
+    position_file = os.path.join(sim_dir, 'POSITION')
+    row = 0
+    while not stop.is_set():
+        fields = rows[row % len(rows)]
+        position = ','.join(fields[gps_fields[0]:gps_fields[1]])
+        if len(fields) >= fix_fields[1]:
+            SharedRecord.publish(position_shm, (position + ',' + ','.join(fields[fix_fields[0]:fix_fields[1]])).encode('ascii'))
+        else:
+            SharedRecord.publish(position_shm, position.encode('ascii'))
+        with open(position_file + '.tmp', 'w') as f:
+            f.write(position + '\n')
+        os.replace(position_file + '.tmp', position_file)
+        row += int(position_period * 4)  # the replayed log was taken at 4 Hz
+        stop.wait(position_period)
+
+
+# starts the boards and the gps feed; returns a dict to hand to stop()
+def start(raw_log_path=None, directory=None):
+    global sim_dir
+    if directory:
+        sim_dir = directory
+    if not os.path.isdir(os.path.join(sim_dir, 'data')):
+        os.makedirs(os.path.join(sim_dir, 'data'))
+    (header, rows) = load_raw_log(raw_log_path)
+    stop_event = threading.Event()
+    boards = [new_board('NANO', '20261018.NANO', nano_fields, nano_pulse_fields, header, rows),
+              new_board('NANO2', '20261018.NANO2', nano2_fields, nano2_pulse_fields, header, rows)]
+    threads = [threading.Thread(target=run_board, args=(board, stop_event)) for board in boards]
+    threads.append(threading.Thread(target=run_position, args=(rows, stop_event)))
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    return {'boards': boards, 'threads': threads, 'stop': stop_event,
+            'env': {'PICKLE_NANO_DEV': boards[0]['link'], 'PICKLE_NANO2_DEV': boards[1]['link'],
+                    'PICKLE_RAMDISK': sim_dir, 'PICKLE_DATA_DIR': os.path.join(sim_dir, 'data')}}
+
+
+def stop(simulation):
+    simulation['stop'].set()
+    for thread in simulation['threads']:
+        thread.join()
+    for board in simulation['boards']:
+        if not board['unplugged'].is_set():
+            os.close(board['master'])
+            os.close(board['slave'])
+        if os.path.lexists(board['link']):
+            os.remove(board['link'])
+
+
+# board 0 is the NANO, 1 the NANO2. The recorder's reads fail as they would
+#  with the cable out, and the link goes nowhere until replug().
+def unplug(simulation, board_number):
+    board = simulation['boards'][board_number]
+    board['unplugged'].set()
+    simulation['threads'][board_number].join()
+    os.close(board['master'])
+    os.close(board['slave'])
+    os.remove(board['link'])
+
+
+def replug(simulation, board_number):  # a fresh board, as if it had just powered up
+    board = new_board(*simulation['boards'][board_number]['plugged'])
+    thread = threading.Thread(target=run_board, args=(board, simulation['stop']))
+    thread.daemon = True
+    thread.start()
+    simulation['boards'][board_number] = board
+    simulation['threads'][board_number] = thread
+
+
+if __name__ == "__main__":
+    raw_log_path = None
+    if len(sys.argv) > 1 and os.path.isfile(sys.argv[1]):
+        raw_log_path = sys.argv[1]
+    simulation = start(raw_log_path, sys.argv[2] if len(sys.argv) > 2 else None)
+    print('Simulating; Ctrl-C to stop. Run the recorder with:')
+    print(' '.join(k + '=' + v for (k, v) in sorted(simulation['env'].items())) + ' bin/PickleRecorder.py')
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        stop(simulation)
+        print('\nanswered ' + ', '.join(board['name'] + ' ' + str(board['commands'])
+                                        for board in simulation['boards']) + ' commands')
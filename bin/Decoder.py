@@ -1,14 +1,31 @@
 #!/usr/bin/env python3
 
-#  version 2022-08-13
+#  version 2026-10-18
 from datetime import datetime
+from array import array
+from operator import methodcaller
+from collections import Counter, namedtuple
+from itertools import islice
+from multiprocessing import Pool
 import time
+import gzip
 import sys
 import os
 
 # constants
 micros_per_minute = 1000000 * 60  # microseconds
 analog_factor = 0.004887585      # 0 = 0V, 512 = ~2.5V, 1023 = 5V
+map_calibration = 2    # which of the MAP options in get_map() is in use
+adc_max = 1023         # analogRead() is 10 bits
+raw_field_count = 29   # 1+15+8+5 elements, see PickleRecorder; it may append more
+pulse_field_count = 36  # lines this wide carry the sketches' pulse timing, see get_pulse_rpm()
+stopped_micros = 2000000  # no pulse for this long and it has stopped; ~30 rpm on one magnet
+rpm_smoothing = 0.0    # --reestimate only: 0 is off, towards 1 smooths the period harder
+data_header = 'mph,fRpm,rRpm,afr,map,ftemp,fpress,lrh,rrh,utc,rpm,egt1,egt2,egt3,egt4'
+batch_size = 10000     # lines per columnar chunk; bounds memory on the Pi
+# one decoded sample: a field per data_header column, each the text the data file
+#  gets. The display and web page take fields by name; no joining and splitting.
+Readings = namedtuple('Readings', data_header)
 
 
 def get_axle_rpm(pulseCount, elapsedMicros):
@@ -31,6 +48,18 @@ def get_engine_rpm(pulseCount, elapsedMicros):
         rpm = micros_per_minute / average_double_pulse_micros
     return str(int(rpm))  # int throws away the fraction
 
+
+# The count/elapsed pair above only sees pulses that land in the window, so one
+#  magnet at a slow roll reads 0 every other sample. The sketches also send the
+#  period between the last two pulses, and how old the last pulse was at the
+#  sample. The next pulse is at least that old, so a slowing wheel reads lower
+#  right away instead of holding its last period, and reads 0 once stopped.
+def get_pulse_rpm(periodMicros, ageMicros, pulses_per_rev):
+    rpm = 0
+    if periodMicros > 0 and ageMicros < stopped_micros:
+        rpm = micros_per_minute / (max(periodMicros, ageMicros) * pulses_per_rev)
+    return str(int(rpm))  # int throws away the fraction
+
 # linear potentiometers give a voltage between 0V-3.3V;
 #   arduino encodes to an int 0-1023; and we want a range 0..100
 # The ride height sensor readings go DOWN as the accordion units are extended
@@ -70,32 +99,78 @@ def get_afr(pinValue):
 def get_map(pinValue):
     voltage = pinValue * analog_factor  # convert from 10bits to voltage
 
-    # Option One:  # https://www.robietherobot.com/storm/mapsensor.htm
-    # psi = (voltage * 8.94) - 14.53
-
-    # Option Two: From DIYautotune, calibration GM 3-bar ... Datasheet: 1.1kPa = 0V,  315.50kPa = 5V (linear)
-    #   pinValueRef: range is: 315.5 - 1.1 = 314.4, divide the range by the number of pin values above zero: 314.4/1023  = .307331 per click
-    # kpa = (.307331 * pinValue) + 1.1
-    #   voltageRef: range is: 315.5 - 1.1 = 314.4, divide the range by the max volts: 314.4/5  = 62.88000
-    kpa = (62.88 * voltage) + 2.1
-
-    # Option Three: calibration of GM 3-bar, Ballenger Motorsports  https://www.bmotorsports.com/shop/product_info.php/cPath/129_143/products_id/1584?osCsid=dp41bpdfqtmg2habab5h8d3nh3
-    #               V = 0.0162 * P - 0.0179
-    #     algebra   P = (0.0179 + V) / 0.0162
-    # kpa = (voltage + 0.0179) / 0.0162
-
-    psi = kpa * 0.145038 # google says so
-    #print("MAP pin: " + str(pinValue) + " V: " + str(voltage) + " kpa: " + str(kpa) + " psi: " + str(psi))
+    if map_calibration == 1:
+        # Option One:  # https://www.robietherobot.com/storm/mapsensor.htm
+        psi = (voltage * 8.94) - 14.53
+    else:
+        if map_calibration == 3:
+            # Option Three: calibration of GM 3-bar, Ballenger Motorsports  https://www.bmotorsports.com/shop/product_info.php/cPath/129_143/products_id/1584?osCsid=dp41bpdfqtmg2habab5h8d3nh3
+            #               V = 0.0162 * P - 0.0179
+            #     algebra   P = (0.0179 + V) / 0.0162
+            kpa = (voltage + 0.0179) / 0.0162
+        else:
+            # Option Two: From DIYautotune, calibration GM 3-bar ... Datasheet: 1.1kPa = 0V,  315.50kPa = 5V (linear)
+            #   pinValueRef: range is: 315.5 - 1.1 = 314.4, divide the range by the number of pin values above zero: 314.4/1023  = .307331 per click
+            # kpa = (.307331 * pinValue) + 1.1
+            #   voltageRef: range is: 315.5 - 1.1 = 314.4, divide the range by the max volts: 314.4/5  = 62.88000
+            kpa = (62.88 * voltage) + 2.1
+        psi = kpa * 0.145038 # google says so
+    #print("MAP pin: " + str(pinValue) + " V: " + str(voltage) + " psi: " + str(psi))
     (whole, fraction) = str(psi).split('.')
     map_val = whole + '.' + fraction[:1]  # return one fractional digit
     return map_val
 
 
-def get_readings(raw_data):   # fed 29 elements, returns 15 elements
+# # # # #  LOOKUP TABLES # # # #
+# Every analog pin arrives as an int 0-1023, so each converter above has only
+#  1024 possible answers. Work them all out once, then decoding a sample is an
+#  index. The tables are rebuilt on first use after a calibration constant
+#  (analog_factor, map_calibration) changes. The batch decoder looks the logged
+#  text up directly, in the same answers keyed by str(pinValue).
+adc_converters = (get_ride_height, get_fuel_pressure, get_fuel_temperature,
+                  get_egt, get_afr, get_map)
+ADC_TABLES = {}
+ADC_FIELD_TABLES = {}
+adc_tables_calibration = None
+
+
+def build_adc_table(converter):
+    table = []
+    for pinValue in range(adc_max + 1):
+        try:
+            table.append(converter(pinValue))
+        except Exception:
+            table.append(None)  # adc_lookup() will call the converter and let it complain
+    return table
+
+
+def adc_tables():
+    global adc_tables_calibration
+    calibration = (analog_factor, map_calibration)
+    if calibration != adc_tables_calibration:
+        for converter in adc_converters:
+            ADC_TABLES[converter] = build_adc_table(converter)
+            ADC_FIELD_TABLES[converter] = dict((str(pinValue), converted) for (pinValue, converted)
+                                               in enumerate(ADC_TABLES[converter]) if converted is not None)
+        adc_tables_calibration = calibration
+    return ADC_TABLES
+
+
+def adc_lookup(tables, converter, pinValue):
+    if 0 <= pinValue <= adc_max:
+        converted = tables[converter][pinValue]
+        if converted is not None:
+            return converted
+    return converter(pinValue)
+
+
+def read_readings(raw_data):   # fed 29 (or more) elements, returns Readings
     mph = fRpm = rRpm = afr = man = ft = fp = lrh = rrh = utc = '0'
     rpm = egt1 = egt2 = egt3 = egt4 = '0'
     try:
+        tables = adc_tables()
         # cook the raw data
+        fields = raw_data.split(',')
         (timestamp, millis,
          frontCount, deltaFrontCount, deltaFrontMicros,
          rearCount, deltaRearCount, deltaRearMicros,
@@ -106,39 +181,406 @@ def get_readings(raw_data):   # fed 29 elements, returns 15 elements
          millis2,
          camPositionCount, deltaCamPositionCount, deltaCamPositionMicros,
          rawEGT1, rawEGT2, rawEGT3, rawEGT4,
-         lat, lon, alt, mph, utc) = raw_data.split(',')
-
-        # calcs and transforms
-        fRpm = get_axle_rpm(int(deltaFrontCount), int(deltaFrontMicros))
-        rRpm = get_axle_rpm(int(deltaRearCount), int(deltaRearMicros))
-        afr = get_afr(int(rawAirFuelRatio))
-        man = get_map(int(rawManifoldAbsolutePressure))
-        ft = get_fuel_temperature(int(rawFuelTemperature))
-        fp = get_fuel_pressure(int(rawFuelPressure))
-        lrh = get_ride_height(int(rawLeftRideHeight))
-        rrh = get_ride_height(int(rawRightRideHeight))
-        rpm = get_engine_rpm(int(deltaCamPositionCount), int(deltaCamPositionMicros))
-        egt1 = get_egt(int(rawEGT1))
-        egt2 = get_egt(int(rawEGT2))
-        egt3 = get_egt(int(rawEGT3))
-        egt4 = get_egt(int(rawEGT4))
+         lat, lon, alt, mph, utc) = fields[:raw_field_count]
+
+        # calcs and transforms. A board that didn't answer has its fields empty
+        #  (see PickleRecorder); its readings stay 0 and the other board's go on.
+        if millis != '':
+            fRpm = get_axle_rpm(int(deltaFrontCount), int(deltaFrontMicros))
+            rRpm = get_axle_rpm(int(deltaRearCount), int(deltaRearMicros))
+            afr = adc_lookup(tables, get_afr, int(rawAirFuelRatio))
+            man = adc_lookup(tables, get_map, int(rawManifoldAbsolutePressure))
+            ft = adc_lookup(tables, get_fuel_temperature, int(rawFuelTemperature))
+            fp = adc_lookup(tables, get_fuel_pressure, int(rawFuelPressure))
+            lrh = adc_lookup(tables, get_ride_height, int(rawLeftRideHeight))
+            rrh = adc_lookup(tables, get_ride_height, int(rawRightRideHeight))
+        if millis2 != '':
+            rpm = get_engine_rpm(int(deltaCamPositionCount), int(deltaCamPositionMicros))
+        if len(fields) >= pulse_field_count:  # '' is a board that didn't send them
+            if fields[COL_FRONT_PERIOD] != '':
+                fRpm = get_pulse_rpm(int(fields[COL_FRONT_PERIOD]), int(fields[COL_FRONT_AGE]), 1)
+                rRpm = get_pulse_rpm(int(fields[COL_REAR_PERIOD]), int(fields[COL_REAR_AGE]), 1)
+            if fields[COL_CAM_PERIOD] != '':
+                rpm = get_pulse_rpm(int(fields[COL_CAM_PERIOD]), int(fields[COL_CAM_AGE]), 2)
+        if millis2 != '':
+            egt1 = adc_lookup(tables, get_egt, int(rawEGT1))
+            egt2 = adc_lookup(tables, get_egt, int(rawEGT2))
+            egt3 = adc_lookup(tables, get_egt, int(rawEGT3))
+            egt4 = adc_lookup(tables, get_egt, int(rawEGT4))
     except Exception as e:
-        print("exception in Decode:get_readings: " + str(e))
+        print("exception in Decode:read_readings: " + str(e))
         print("RawData: " + raw_data)
 
-    #returnCols = 'mph,fRpm,rRpm,afr,man,ftemp,fpress,lrh,rrh,utc,rpm,egt1,egt2,egt3,egt4'
-    return (mph + ',' + fRpm + ',' + rRpm + ','
-            + afr + ',' + man + ','
-            + ft + ',' + fp + ','
-            + lrh + ',' + rrh + ','
-            + utc + ',' + rpm + ','
-            + egt1 + ',' + egt2 + ','
-            + egt3 + ',' + egt4
-            )
+    return Readings(mph, fRpm, rRpm, afr, man, ft, fp, lrh, rrh, utc, rpm, egt1, egt2, egt3, egt4)
+
+
+def get_readings(raw_data):   # the same, as a data file line
+    return ','.join(read_readings(raw_data))
+
+
+# # # # #  BATCH DECODING # # # #
+# The columnar twin of read_readings(): a chunk of raw lines is turned into
+#  typed columns and each converter runs once per distinct value in a column,
+#  instead of once per field per line. Output is identical to read_readings().
+# Any line that would make read_readings() stumble (wrong field count, junk
+#  values, a zero elapsed time) is handed to read_readings() itself, so even
+#  the partially-zeroed rows come out the same.
+
+# positions in the raw line of the fields get_readings() uses
+COL_DELTA_FRONT_COUNT, COL_DELTA_FRONT_MICROS = 3, 4
+COL_DELTA_REAR_COUNT, COL_DELTA_REAR_MICROS = 6, 7
+COL_LEFT_RIDE_HEIGHT, COL_RIGHT_RIDE_HEIGHT = 8, 9
+COL_FUEL_PRESSURE, COL_FUEL_TEMPERATURE = 10, 11
+COL_AIR_FUEL_RATIO, COL_MANIFOLD_PRESSURE = 13, 14
+COL_DELTA_CAM_COUNT, COL_DELTA_CAM_MICROS = 18, 19
+COL_EGT1, COL_EGT2, COL_EGT3, COL_EGT4 = 20, 21, 22, 23
+COL_MPH, COL_UTC = 27, 28
+COL_MILLIS, COL_MILLIS2 = 1, 16
+# after nanoSkewMillis, the sketches' pulse timing; see get_pulse_rpm()
+COL_FRONT_PERIOD, COL_FRONT_AGE = 30, 31
+COL_REAR_PERIOD, COL_REAR_AGE = 32, 33
+COL_CAM_PERIOD, COL_CAM_AGE = 34, 35
+
+
+def int_column(values, bad):
+    # 'q' is 64 bits even on the 32-bit Pi; micros deltas can pass 2**31
+    try:
+        return array('q', map(int, values))
+    except (ValueError, OverflowError):
+        column = array('q')
+        for i, value in enumerate(values):
+            try:
+                column.append(int(value))
+            except (ValueError, OverflowError):
+                bad.add(i)
+                column.append(0)
+        return column
+
+
+def convert_column(converter, values, bad):
+    tables = adc_tables()
+    try:
+        return list(map(ADC_FIELD_TABLES[converter].__getitem__, values))
+    except KeyError:
+        pass  # junk, or a pin written some other way ('0512'); one lookup per distinct field
+    converted = dict.fromkeys(values)
+    failed = set()
+    for value in converted:
+        try:
+            converted[value] = adc_lookup(tables, converter, int(value))
+        except Exception:
+            converted[value] = ''
+            failed.add(value)
+    if failed:
+        bad.update(i for i, value in enumerate(values) if value in failed)
+    return list(map(converted.__getitem__, values))
+
+
+def rpm_column(counts, micros, pulses_per_rev, bad):
+    # same arithmetic as get_axle_rpm() (1 pulse per rev) and get_engine_rpm() (1/2)
+    try:
+        if pulses_per_rev == 1:
+            return [str(int(micros_per_minute / (m / c))) if c > 0 else '0'
+                    for (c, m) in zip(counts, micros)]
+        return [str(int(micros_per_minute / (m / (c * 2)))) if c > 0 else '0'
+                for (c, m) in zip(counts, micros)]
+    except ZeroDivisionError:  # a pulse with no elapsed time; get_readings() zeroes the row
+        bad.update(i for (i, (c, m)) in enumerate(zip(counts, micros)) if c > 0 and m == 0)
+        return rpm_column([0 if m == 0 else c for (c, m) in zip(counts, micros)],
+                          micros, pulses_per_rev, bad)
+
+
+def pulse_rpm_column(present, periods, ages, window, pulses_per_rev, bad):
+    # like get_readings(), a board's pulse timing is used when its first field is there
+    rpms = list(window)
+    for i in [i for (i, field) in enumerate(present) if field != '']:
+        try:
+            rpms[i] = get_pulse_rpm(int(periods[i]), int(ages[i]), pulses_per_rev)
+        except ValueError:
+            bad.add(i)
+    return rpms
+
+
+def set_readings(columns, i, readings):  # puts one line's Readings into the columns
+    for (column, value) in zip(columns, readings):
+        column[i] = value
+
+
+# fed stripped raw lines, returns a list per data_header column of the text for each line
+def decode_columns(lines):
+    if not lines:
+        return [[] for name in Readings._fields]
+    # the recorder may log columns past the 29th; take the width most lines have
+    #  and send lines with any other number of fields straight to read_readings()
+    field_counts = list(map(methodcaller('count', ','), lines))
+    width = Counter(field_counts).most_common(1)[0][0] + 1
+    if width < raw_field_count:
+        width = raw_field_count
+    bad = set(i for (i, commas) in enumerate(field_counts) if commas != width - 1)
+    rows = lines
+    if bad:  # a line of zeros the right width holds their place in the columns
+        zeros = ','.join(['0'] * width)
+        rows = [zeros if i in bad else line for (i, line) in enumerate(lines)]
+
+    # one split for the whole chunk; every width-th field is a column
+    fields = ','.join(rows).split(',')
+
+    def ints(col):
+        return int_column(fields[col::width], bad)
+
+    def analog(converter, col):
+        return convert_column(converter, fields[col::width], bad)
+
+    fRpm = rpm_column(ints(COL_DELTA_FRONT_COUNT), ints(COL_DELTA_FRONT_MICROS), 1, bad)
+    rRpm = rpm_column(ints(COL_DELTA_REAR_COUNT), ints(COL_DELTA_REAR_MICROS), 1, bad)
+    afr = analog(get_afr, COL_AIR_FUEL_RATIO)
+    man = analog(get_map, COL_MANIFOLD_PRESSURE)
+    ft = analog(get_fuel_temperature, COL_FUEL_TEMPERATURE)
+    fp = analog(get_fuel_pressure, COL_FUEL_PRESSURE)
+    lrh = analog(get_ride_height, COL_LEFT_RIDE_HEIGHT)
+    rrh = analog(get_ride_height, COL_RIGHT_RIDE_HEIGHT)
+    rpm = rpm_column(ints(COL_DELTA_CAM_COUNT), ints(COL_DELTA_CAM_MICROS), 2, bad)
+    if width >= pulse_field_count:
+        front_present = fields[COL_FRONT_PERIOD::width]
+        fRpm = pulse_rpm_column(front_present, front_present, fields[COL_FRONT_AGE::width], fRpm, 1, bad)
+        rRpm = pulse_rpm_column(front_present, fields[COL_REAR_PERIOD::width],
+                                fields[COL_REAR_AGE::width], rRpm, 1, bad)
+        cam_present = fields[COL_CAM_PERIOD::width]
+        rpm = pulse_rpm_column(cam_present, cam_present, fields[COL_CAM_AGE::width], rpm, 2, bad)
+    egt1 = analog(get_egt, COL_EGT1)
+    egt2 = analog(get_egt, COL_EGT2)
+    egt3 = analog(get_egt, COL_EGT3)
+    egt4 = analog(get_egt, COL_EGT4)
+
+    # same order as Readings
+    columns = [fields[COL_MPH::width], fRpm, rRpm, afr, man, ft, fp, lrh, rrh,
+               fields[COL_UTC::width], rpm, egt1, egt2, egt3, egt4]
+    for i in bad:
+        set_readings(columns, i, read_readings(lines[i]))
+    return columns
+
+
+def decode_lines(lines):  # fed stripped raw lines, returns get_readings() strings
+    return list(map(','.join, zip(*decode_columns(lines))))
+
+
+# # # # #  RE-ESTIMATION # # # #
+# Logs from before the sketches sent pulse timing can get the same kind of speed
+#  after the fact: a window with pulses gives the period, and the board's millis
+#  since the last window with a pulse stands in for the last pulse's age. Each
+#  channel carries its period and last pulse from one chunk to the next, so a
+#  file is re-estimated in order, one column at a time. Decoder.py --reestimate
+# (count column, elapsed column, the board's millis column, pulses per rev, data column)
+reestimated_channels = {
+    'front': (COL_DELTA_FRONT_COUNT, COL_DELTA_FRONT_MICROS, COL_MILLIS, 1, 1),
+    'rear': (COL_DELTA_REAR_COUNT, COL_DELTA_REAR_MICROS, COL_MILLIS, 1, 2),
+    'cam': (COL_DELTA_CAM_COUNT, COL_DELTA_CAM_MICROS, COL_MILLIS2, 2, 10),
+}
+millis_modulus = 2 ** 32  # the sketches' unsigned long millis()
+
+
+def new_estimates():
+    return dict((name, {'period': 0.0, 'pulse_millis': None}) for name in reestimated_channels)
+
+
+def reestimate_column(counts, elapsed, millis, pulses_per_rev, estimate):
+    (period, pulse_millis) = (estimate['period'], estimate['pulse_millis'])
+    rpms = []
+    for (count, micros, now) in zip(counts, elapsed, millis):
+        if count > 0 and micros > 0:
+            window_period = micros / count
+            if period > 0:  # rpm_smoothing 0 takes each window's period as it is
+                window_period = period + (1 - rpm_smoothing) * (window_period - period)
+            (period, pulse_millis) = (window_period, now)
+        if pulse_millis is None:
+            rpms.append('0')
+        else:  # a board that restarted reads as a very old pulse until the next one
+            rpms.append(get_pulse_rpm(period, ((now - pulse_millis) % millis_modulus) * 1000, pulses_per_rev))
+    (estimate['period'], estimate['pulse_millis']) = (period, pulse_millis)
+    return rpms
+
+
+def reestimate_lines(lines, decoded, estimates):  # rewrites the rpm columns of decoded
+    # only lines without pulse timing of their own; junk lines don't move the estimates
+    rows = [i for (i, line) in enumerate(lines)
+            if raw_field_count - 1 <= line.count(',') < pulse_field_count - 1]
+    fields = [lines[i].split(',') for i in rows]
+    bad = set()
+    columns = {}
+    for (name, (count_col, micros_col, millis_col, _, _)) in reestimated_channels.items():
+        columns[name] = [int_column([f[col] for f in fields], bad)
+                         for col in (count_col, micros_col, millis_col)]
+    keep = [n for n in range(len(rows)) if n not in bad]
+    readings = [decoded[rows[n]].split(',') for n in keep]
+    for (name, (_, _, _, pulses_per_rev, data_col)) in reestimated_channels.items():
+        (counts, elapsed, millis) = [[column[n] for n in keep] for column in columns[name]]
+        for (reading, rpm) in zip(readings, reestimate_column(counts, elapsed, millis, pulses_per_rev,
+                                                              estimates[name])):
+            reading[data_col] = rpm
+    for (n, reading) in zip(keep, readings):
+        decoded[rows[n]] = ','.join(reading)
+    return decoded
+
+
+def decode_file(raw_file, data_file, reestimate=False):  # raw_file: an open csv, or RawLog.read_lines()
+    data_file.write(data_header + '\n')
+    lines_decoded = 0
+    estimates = new_estimates()
+    raw_lines = iter(raw_file)
+    while True:
+        lines = list(islice(raw_lines, batch_size))
+        if not lines:
+            return lines_decoded
+        # all epoch times will start with '1'
+        chunk = [line.rstrip() for line in lines if line.startswith('1')]
+        if chunk:
+            decoded = decode_lines(chunk)
+            if reestimate:
+                decoded = reestimate_lines(chunk, decoded, estimates)
+            data_file.write('\n'.join(decoded) + '\n')
+            lines_decoded += len(chunk)
+
+
+# # # # #  FILES # # # #
+# the recorder may have gzipped a finished run: raw-X.csv.gz
+def data_path_for(raw_file_path):
+    data_file_path = raw_file_path.replace('raw', 'data')
+    if data_file_path.endswith('.gz'):
+        data_file_path = data_file_path[:-len('.gz')]
+    if data_file_path.endswith('.bin'):  # the recorder's binary format, see RawLog
+        data_file_path = data_file_path[:-len('.bin')] + '.csv'
+    return data_file_path
+
+
+# the csv lines of any raw log: csv, gzipped csv, or RawLog's binary
+def raw_lines(raw_file_path):
+    if raw_file_path.endswith('.bin'):
+        import RawLog
+        return RawLog.read_lines(raw_file_path)
+    if raw_file_path.endswith('.gz'):
+        return gzip.open(raw_file_path, 'rt')
+    return open(raw_file_path, 'r')
+
+
+def decode_raw_file(raw_file_path, reestimate=False):  # returns (data file path, lines decoded)
+    data_file_path = data_path_for(raw_file_path)
+    # written aside and moved into place, so a data file is never half there
+    temp_file_path = data_file_path + '.tmp'
+    lines = raw_lines(raw_file_path)
+    try:
+        with open(temp_file_path, 'w') as data_file:
+            lines_decoded = decode_file(lines, data_file, reestimate)
+    finally:
+        if hasattr(lines, 'close'):
+            lines.close()
+    os.replace(temp_file_path, data_file_path)
+    return (data_file_path, lines_decoded)
+
+
+def decode_raw_file_in_pool(raw_file_path):  # one bad file shouldn't stop the rest
+    try:
+        return decode_raw_file(raw_file_path)
+    except Exception as e:
+        print('Exception decoding ' + raw_file_path + ': ' + str(e))
+        return (None, 0)
+
+
+# a data file written after its raw file was last touched is up to date
+def is_decoded(raw_file_path):
+    data_file_path = data_path_for(raw_file_path)
+    return (os.path.isfile(data_file_path)
+            and os.path.getmtime(data_file_path) >= os.path.getmtime(raw_file_path))
+
+
+def find_raw_files(data_dir):
+    return sorted(os.path.join(data_dir, f) for f in os.listdir(data_dir)
+                  if f.startswith('raw-') and f.endswith(('.csv', '.bin', '.csv.gz')))
+
+
+def decode_all(data_dir):
+    raw_file_paths = find_raw_files(data_dir)
+    stale = [raw_file_path for raw_file_path in raw_file_paths if not is_decoded(raw_file_path)]
+    print(str(len(raw_file_paths) - len(stale)) + ' of ' + str(len(raw_file_paths)) +
+          ' raw files already decoded in ' + data_dir)
+    if not stale:
+        return
+    start = time.monotonic()
+    lines_decoded = 0
+    # biggest first, so one long session doesn't start last and finish alone
+    stale.sort(key=os.path.getsize, reverse=True)
+    with Pool() as pool:
+        for (data_file_path, lines) in pool.imap_unordered(decode_raw_file_in_pool, stale):
+            if data_file_path:
+                print('Wrote data file to: ' + data_file_path)
+            lines_decoded += lines
+    elapsed = time.monotonic() - start
+    print('Decoded ' + str(lines_decoded) + ' lines from ' + str(len(stale)) + ' files in %.1fs, %.0f lines/sec'
+          % (elapsed, lines_decoded / elapsed))
+
+
+# # # # #  SESSIONS # # # #
+# A whole run held in memory for analysis: the raw timestamps and a column per
+#  data_header channel. The numeric channels are array('d'), 8 bytes a sample
+#  instead of a str each; one that didn't decode to a number is nan. utc stays text.
+text_channels = ('utc',)
+
+
+def number_column(values):
+    try:
+        return array('d', map(float, values))
+    except ValueError:
+        column = array('d')
+        for value in values:
+            try:
+                column.append(float(value))
+            except ValueError:
+                column.append(float('nan'))
+        return column
+
+
+def load_session(raw_file_path):  # {'path', 'timestamps', 'channels': {name: column}}
+    session = {'path': raw_file_path, 'timestamps': array('d'),
+               'channels': dict((name, [] if name in text_channels else array('d'))
+                                for name in Readings._fields)}
+    lines = iter(raw_lines(raw_file_path))
+    try:
+        while True:
+            batch = list(islice(lines, batch_size))
+            if not batch:
+                return session
+            # all epoch times will start with '1'
+            chunk = [line.rstrip() for line in batch if line.startswith('1')]
+            session['timestamps'].extend(number_column([line[:line.find(',')] for line in chunk]))
+            for (name, column) in zip(Readings._fields, decode_columns(chunk)):
+                if name in text_channels:
+                    session['channels'][name].extend(column)
+                else:
+                    session['channels'][name].extend(number_column(column))
+    finally:
+        if hasattr(lines, 'close'):
+            lines.close()
 
 
 # # # # #  MAIN # # # #
+#  Decoder.py raw-<timestamp>.csv    decodes one raw file
+#  Decoder.py --all [data_dir]       decodes every raw file that needs it
+#  Decoder.py --reestimate raw-<timestamp>.csv   decodes one, with the speeds re-estimated
 if __name__ == "__main__":
+    reestimate = False
+    if len(sys.argv) == 3 and sys.argv[1] == '--reestimate':
+        reestimate = True
+        del sys.argv[1]
+
+    if len(sys.argv) >= 2 and sys.argv[1] == '--all':
+        data_dir = '/var/www/html/data'
+        if len(sys.argv) > 2:
+            data_dir = sys.argv[2]
+        try:
+            decode_all(data_dir)
+        except Exception as e:
+            print('Exception in main loop: ' + str(e))
+        sys.exit()
+
     if len(sys.argv) != 2:
         print('Error: supply path to raw file')
         sys.exit()
@@ -149,15 +591,9 @@ if __name__ == "__main__":
     if not 'raw' in raw_file_path:
         print("Error: filename must have 'raw' in it. NoGood: " + raw_file_path)
         sys.exit()
-    data_file_path = raw_file_path.replace('raw', 'data')
 
     try:
-        with open(raw_file_path, 'r') as raw_file:
-            with open(data_file_path, 'w') as data_file:
-                data_file.write('mph,fRpm,rRpm,afr,map,ftemp,fpress,lrh,rrh,utc,rpm,egt1,egt2,egt3,egt4\n')
-                for line in raw_file:
-                    if line.startswith('1'):  # all epoch times will
-                        data_file.write(get_readings(line.rstrip()) + '\n')
+        (data_file_path, lines_decoded) = decode_raw_file(raw_file_path, reestimate)
         print('Wrote data file to: ' + data_file_path)
 
     except Exception as e:
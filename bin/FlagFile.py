@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+
+#  version 2026-10-18
+# Whether a flag file is there, like the display's live_readings, without a stat
+#  each time we ask: inotify on the file's directory says when it comes or goes,
+#  and asking is a read() that finds nothing to read. Where inotify can't be had
+#  (no libc to load, out of watches, the directory went away), it falls back to
+#  a stat at most once per poll_interval.
+#
+# usage: FlagFile.py <path>   prints each change of the flag, for trying it out
+import ctypes.util
+import ctypes
+import struct
+import time
+import sys
+import os
+
+# constants
+poll_interval = 1.0  # seconds, without inotify
+read_size = 4096
+# from <sys/inotify.h>
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_MOVE_SELF = 0x800
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+watch_mask = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE_SELF | IN_MOVE_SELF
+event_header = struct.Struct('iIII')  # wd, mask, cookie, name length; then the name
+
+
+def inotify_fd(directory):  # a non-blocking inotify fd watching directory
+    libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+    fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+    if fd < 0:
+        raise OSError(ctypes.get_errno(), 'inotify_init1: ' + os.strerror(ctypes.get_errno()))
+    if libc.inotify_add_watch(fd, directory.encode(), watch_mask) < 0:
+        error = ctypes.get_errno()
+        os.close(fd)
+        raise OSError(error, 'inotify_add_watch: ' + os.strerror(error))
+    return fd
+
+
+def watch(path):
+    flag = {'path': path, 'name': os.path.basename(path).encode(), 'fd': None,
+            'set': False, 'checked': 0.0}
+    try:
+        flag['fd'] = inotify_fd(os.path.dirname(os.path.abspath(path)))
+    except (OSError, AttributeError) as e:  # AttributeError: a libc without inotify
+        print('FlagFile: no inotify for ' + path + ', checking every ' + str(poll_interval) + 's: ' + str(e))
+    # looked at once the watch is in place, so a change in between isn't missed
+    flag['set'] = os.path.isfile(path)
+    flag['checked'] = time.monotonic()
+    return flag
+
+
+def is_set(flag):
+    if flag['fd'] is None:
+        if time.monotonic() - flag['checked'] >= poll_interval:
+            flag['set'] = os.path.isfile(flag['path'])
+            flag['checked'] = time.monotonic()
+        return flag['set']
+    while True:
+        try:
+            events = os.read(flag['fd'], read_size)
+        except BlockingIOError:
+            return flag['set']  # nothing has happened
+        except OSError as e:
+            print('exception in FlagFile.is_set: ' + str(e))
+            stop_watching(flag)
+            return is_set(flag)
+        read_events(flag, events)
+        if flag['fd'] is None:
+            return is_set(flag)
+
+
+def read_events(flag, events):
+    offset = 0
+    while offset + event_header.size <= len(events):
+        (wd, mask, cookie, length) = event_header.unpack_from(events, offset)
+        name = events[offset + event_header.size:offset + event_header.size + length].rstrip(b'\0')
+        offset += event_header.size + length
+        if mask & IN_Q_OVERFLOW:  # events were lost; look for ourselves
+            flag['set'] = os.path.isfile(flag['path'])
+        elif mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+            stop_watching(flag)  # the directory itself went away
+            return
+        elif name == flag['name']:
+            flag['set'] = bool(mask & (IN_CREATE | IN_MOVED_TO))
+
+
+def stop_watching(flag):
+    if flag['fd'] is not None:
+        os.close(flag['fd'])
+        flag['fd'] = None
+    flag['checked'] = 0.0  # so the next is_set() looks
+
+
+# # # # #  MAIN # # # #
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print('Error: supply the path of a flag file')
+        sys.exit()
+    flag = watch(sys.argv[1])
+    was_set = is_set(flag)
+    print(sys.argv[1] + (' is there' if was_set else ' is not there') + '; Ctrl-C to stop')
+    try:
+        while True:
+            time.sleep(0.25)
+            if is_set(flag) != was_set:
+                was_set = not was_set
+                print(sys.argv[1] + (' appeared' if was_set else ' went away'))
+    except KeyboardInterrupt:
+        stop_watching(flag)
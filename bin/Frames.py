@@ -0,0 +1,87 @@
+#  version 2026-10-18
+# The arduino sketches' streaming mode ('s' starts it, 'x' stops it, '1'-'9' set
+#  10-90 Hz): each board samples on its own clock and sends a few samples a line,
+#    $F,<frame>,<samples>|<micros>,<fields>|<micros>,<fields>...*<checksum>\r\n
+#  where <fields> are what the board answers to 'd', <micros> is the board's
+#  micros() when it took the sample, <frame> counts up and wraps at 65536, and
+#  <checksum> is the Fletcher-16 of everything between '$' and '*' in 4 hex digits.
+#
+# A reader is fed whatever bytes have arrived, and hands back the whole samples
+#  among them. It counts frames that went missing (a gap in <frame>) and frames
+#  that arrived damaged (a bad checksum or shape; these leave a gap too). Anything
+#  that isn't a frame, like the sketch's startup message or a command's answer,
+#  is passed over.
+import time
+
+# constants
+max_line = 2048      # bytes without a newline before we give up on the line
+frame_modulus = 65536  # the sketch's unsigned int frame counter
+micros_modulus = 2 ** 32
+
+
+def fletcher16(data):
+    sum1 = sum2 = 0
+    for byte in bytearray(data):
+        sum1 = (sum1 + byte) % 255
+        sum2 = (sum2 + sum1) % 255
+    return (sum2 << 8) | sum1
+
+
+# what the sketch sends, for the simulator; samples are (micros, fields) pairs
+def encode_frame(frame_number, samples):
+    body = ('F,%d,%d' % (frame_number % frame_modulus, len(samples)) +
+            ''.join('|%d,%s' % (micros % micros_modulus, fields) for (micros, fields) in samples))
+    return ('$' + body + '*%04X\r\n' % fletcher16(body.encode('ascii'))).encode('ascii')
+
+
+def new_reader(name, field_count):
+    return {'name': name, 'field_count': field_count, 'buffer': b'', 'next_frame': None,
+            'frames': 0, 'samples': 0, 'dropped_frames': 0, 'corrupt_frames': 0}
+
+
+# returns [(sample time, micros, fields)]; the time is worked back from when the
+#  frame arrived (the last sample in it was just taken) using the board's micros()
+def feed(reader, data, arrived=None):
+    if arrived is None:
+        arrived = time.time()
+    reader['buffer'] += data
+    samples = []
+    while b'\n' in reader['buffer']:
+        (line, reader['buffer']) = reader['buffer'].split(b'\n', 1)
+        start = line.find(b'$')
+        if start >= 0:
+            samples.extend(read_frame(reader, line[start + 1:].rstrip(b'\r'), arrived))
+    if len(reader['buffer']) > max_line:
+        reader['buffer'] = b''  # no newline coming; wait for the next one
+        reader['corrupt_frames'] += 1
+    return samples
+
+
+def read_frame(reader, frame, arrived):
+    try:
+        (body, checksum) = frame.rsplit(b'*', 1)
+        if int(checksum, 16) != fletcher16(body):
+            raise ValueError('bad checksum')
+        parts = body.decode('ascii').split('|')
+        (tag, frame_number, count) = parts[0].split(',')
+        (frame_number, count) = (int(frame_number), int(count))
+        if tag != 'F' or count < 1 or count != len(parts) - 1:  # the sketch never sends an empty one
+            raise ValueError('bad frame')
+        samples = []
+        for part in parts[1:]:
+            (micros, fields) = part.split(',', 1)
+            if fields.count(',') < reader['field_count'] - 1:  # newer sketches send more
+                raise ValueError('bad sample')
+            samples.append((int(micros), fields))
+    except (ValueError, UnicodeError):
+        reader['corrupt_frames'] += 1
+        return []
+
+    if reader['next_frame'] is not None and frame_number != 0:  # 0: the board (re)started streaming
+        reader['dropped_frames'] += (frame_number - reader['next_frame']) % frame_modulus
+    reader['next_frame'] = (frame_number + 1) % frame_modulus
+    reader['frames'] += 1
+    reader['samples'] += len(samples)
+    last_micros = samples[-1][0]
+    return [(arrived - ((last_micros - micros) % micros_modulus) / 1000000.0, micros, fields)
+            for (micros, fields) in samples]
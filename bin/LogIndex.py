@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+
+#  version 2026-10-18
+# Finding "the 30 seconds around 15:55" in a long raw log without reading it from
+#  the top. A raw or data csv is mmapped, and a side-car <log>.idx keeps the byte
+#  offset of every index_every-th sample line, with its sample number and (in a
+#  raw log) its timestamp. A time window is a binary search in the index and a
+#  scan of at most index_every lines at each end, and comes back as a memoryview
+#  of the mapped file; nothing is copied until it is written out.
+# The recorder writes the index when it finishes a run; otherwise it is made on
+#  first use. An index for a file that has grown since (the run being recorded)
+#  is carried on from where it stopped; one for a file that was replaced is redone.
+# A data file has a row per raw line that starts with an epoch time (see Decoder),
+#  so its windows are found by sample number, through its raw log's timestamps.
+# Only plain csv can be mapped; gzipped and .bin logs are for Decoder.raw_lines().
+#
+# usage: LogIndex.py <raw-or-data csv>                 (re)write its index
+#        LogIndex.py <raw-or-data csv> <start> <end>   print the lines between two times:
+#          epoch seconds, or HH:MM[:SS] local time on the day the run started
+from datetime import datetime
+from bisect import bisect_left, bisect_right
+from array import array
+import mmap
+import time
+import sys
+import os
+
+# constants
+index_every = 256   # sample lines between index entries; the most a lookup scans
+index_suffix = '.idx'
+nan = float('nan')
+
+
+def is_raw_log(path):
+    return os.path.basename(path).startswith('raw')
+
+
+def index_path(path):
+    return path + index_suffix
+
+
+def new_index(st):
+    return {'size': 0, 'inode': st.st_ino, 'samples': 0, 'end': 0,
+            'numbers': array('q'), 'offsets': array('q'), 'stamps': array('d')}
+
+
+def read_index(path):  # the side-car as it was written, or None
+    try:
+        with open(index_path(path)) as f:
+            (size, inode, samples, end) = [int(field) for field in f.readline().split(',')]
+            index = {'size': size, 'inode': inode, 'samples': samples, 'end': end,
+                     'numbers': array('q'), 'offsets': array('q'), 'stamps': array('d')}
+            for line in f:
+                (number, offset, stamp) = line.split(',')
+                index['numbers'].append(int(number))
+                index['offsets'].append(int(offset))
+                index['stamps'].append(float(stamp))
+        return index
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def write_index(path, index):  # replaced whole, so a reader never sees half of one
+    try:
+        with open(index_path(path) + '.tmp', 'w') as f:
+            f.write('%d,%d,%d,%d\n' % (index['size'], index['inode'], index['samples'], index['end']))
+            for entry in zip(index['numbers'], index['offsets'], index['stamps']):
+                f.write('%d,%d,%r\n' % entry)
+        os.replace(index_path(path) + '.tmp', index_path(path))
+    except (IOError, OSError) as e:  # a read-only data directory; it lives in memory only
+        print('exception in LogIndex.write_index: ' + str(e))
+
+
+def line_stamp(mapped, start, newline, junk):  # junk for a line that doesn't start with a number
+    comma = mapped.find(b',', start, newline)
+    try:
+        return float(mapped[start:newline if comma < 0 else comma])
+    except ValueError:
+        return junk
+
+
+# carries the index on over the whole lines past index['end']. An entry is due
+#  every index_every samples; in a raw log a junk line (a cut-short write) passes
+#  it on to the next line whose stamp reads, so no nan reaches the binary search
+def extend_index(log, index):
+    (mapped, raw) = (log['map'], log['raw'])
+    (position, samples) = (index['end'], index['samples'])
+    while True:
+        newline = mapped.find(b'\n', position)
+        if newline < 0:
+            break
+        # all epoch times will start with '1'; a data file has its header, then rows
+        if (mapped[position:position + 1] == b'1') if raw else position > 0:
+            if not index['numbers'] or samples - index['numbers'][-1] >= index_every:
+                stamp = line_stamp(mapped, position, newline, nan) if raw else nan
+                if not raw or stamp == stamp:  # nan != nan
+                    index['numbers'].append(samples)
+                    index['offsets'].append(position)
+                    index['stamps'].append(stamp)
+            samples += 1
+        position = newline + 1
+    (index['samples'], index['end'], index['size']) = (samples, position, len(mapped))
+
+
+def open_log(path):  # maps the csv and brings its index up to date
+    log = {'path': path, 'raw': is_raw_log(path), 'file': open(path, 'rb'), 'map': b''}
+    st = os.fstat(log['file'].fileno())
+    if st.st_size > 0:
+        log['map'] = mmap.mmap(log['file'].fileno(), 0, access=mmap.ACCESS_READ)
+    index = read_index(path)
+    if (index is None or index['inode'] != st.st_ino or index['size'] > st.st_size or
+            (log['raw'] and any(stamp != stamp for stamp in index['stamps']))):  # nan, from before
+        index = new_index(st)
+    if index['size'] < st.st_size or index['samples'] == 0:
+        extend_index(log, index)
+        write_index(path, index)
+    log['index'] = index
+    return log
+
+
+def close_log(log):
+    if not isinstance(log['map'], bytes):
+        log['map'].close()
+    log['file'].close()
+
+
+def index_log(path):  # for the recorder, once a run is finished
+    try:
+        close_log(open_log(path))
+    except Exception as e:
+        print('exception in LogIndex.index_log: ' + str(e))
+
+
+def header(log):
+    return log['map'][:log['map'].find(b'\n') + 1]
+
+
+# # # # #  LOOKUPS # # # #
+# Each returns (byte offset, sample number) of the first sample line past the
+#  mark, scanning on from the index entry before it; the end of the last whole
+#  line if there is none.
+def scan_to(log, entry, reached):
+    index = log['index']
+    (mapped, raw) = (log['map'], log['raw'])
+    if entry < 0:
+        (position, samples) = (0, 0)
+    else:
+        (position, samples) = (index['offsets'][entry], index['numbers'][entry])
+    while position < index['end']:
+        newline = mapped.find(b'\n', position)
+        if (mapped[position:position + 1] == b'1') if raw else position > 0:
+            if reached(mapped, position, newline, samples):
+                return (position, samples)
+            samples += 1
+        position = newline + 1
+    return (index['end'], index['samples'])
+
+
+def find_time(log, stamp):  # raw logs only: the first sample stamped stamp or later
+    entry = bisect_left(log['index']['stamps'], stamp) - 1  # entries before it, not at it
+    return scan_to(log, entry, lambda mapped, start, newline, samples:
+                   line_stamp(mapped, start, newline, nan) >= stamp)
+
+
+def find_sample(log, number):
+    entry = bisect_right(log['index']['numbers'], number) - 1
+    return scan_to(log, entry, lambda mapped, start, newline, samples: samples >= number)
+
+
+def time_window(log, start, end):  # the raw lines stamped start <= t < end
+    first = find_time(log, start)
+    last = find_time(log, end)
+    if last[0] <= first[0]:
+        return (memoryview(b''), first[1], first[1])
+    return (memoryview(log['map'])[first[0]:last[0]], first[1], last[1])
+
+
+def sample_window(log, first_sample, end_sample):  # sample lines first_sample <= n < end_sample
+    first = find_sample(log, first_sample)
+    last = find_sample(log, end_sample)
+    if last[0] <= first[0]:
+        return memoryview(b'')
+    return memoryview(log['map'])[first[0]:last[0]]
+
+
+# (memoryview of the lines stamped start <= t < end, the log they are in). For a
+#  data file, raw_path is its raw log. Release the view before close_log().
+def open_window(path, start, end, raw_path=None):
+    log = open_log(path)
+    if log['raw']:
+        return (time_window(log, start, end)[0], log)
+    raw_log = open_log(raw_path)
+    try:
+        (raw_window, first, last) = time_window(raw_log, start, end)
+        raw_window.release()
+    finally:
+        close_log(raw_log)
+    return (sample_window(log, first, last), log)
+
+
+def first_stamp(log):  # nan for a log with no samples
+    (position, samples) = find_sample(log, 0)
+    return line_stamp(log['map'], position, log['map'].find(b'\n', position), nan)
+
+
+def parse_time(text, day_stamp):  # epoch seconds, or HH:MM[:SS] on day_stamp's day
+    if ':' not in text:
+        return float(text)
+    parts = [int(part) for part in text.split(':')] + [0]
+    day = datetime.fromtimestamp(day_stamp)
+    return time.mktime(day.replace(hour=parts[0], minute=parts[1], second=parts[2], microsecond=0).timetuple())
+
+
+# # # # #  MAIN # # # #
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 4):
+        print('Error: supply the path of a raw or data csv, and optionally a start and end time')
+        sys.exit()
+    path = sys.argv[1]
+    raw_path = path if is_raw_log(path) else os.path.join(os.path.dirname(path),
+                                                          os.path.basename(path).replace('data', 'raw', 1))
+    if not os.path.isfile(path) or not os.path.isfile(raw_path):
+        print('Error: file not found at ' + (path if not os.path.isfile(path) else raw_path))
+        sys.exit()
+    if len(sys.argv) == 2:
+        started = time.monotonic()
+        log = open_log(path)
+        print('Indexed %d samples of %s in %.3fs: %s' % (log['index']['samples'], path,
+                                                        time.monotonic() - started, index_path(path)))
+        close_log(log)
+        sys.exit()
+    raw_log = open_log(raw_path)
+    (start, end) = (parse_time(sys.argv[2], first_stamp(raw_log)), parse_time(sys.argv[3], first_stamp(raw_log)))
+    close_log(raw_log)
+    (window, log) = open_window(path, start, end, raw_path)
+    sys.stdout.buffer.write(header(log))
+    sys.stdout.buffer.write(window)
+    window.release()
+    close_log(log)
@@ -1,11 +1,13 @@
-#!/usr/bin/python
+#!/usr/bin/python3
 
+import Timing
+IMPORTED = Timing.now()  # for the time to first frame, if /proc can't say
 import pygame
+import zlib
+import queue
 import os
-import subprocess
 from time import sleep
-import RPi.GPIO as GPIO
-import Decoder
+# Decoder and SharedRecord are imported by start_live(), when live read is first wanted
 
 # Colours
 BLACK = (0, 0, 0)
@@ -29,6 +31,18 @@ button_map = {
     LIVEREAD: {'color': GREEN,'text': 'Toggling Live Read',  'action': 'toggle'},
     SHUTDOWN: {'color': RED,  'text': 'Shutdown; wait 10s',  'os_cmd': 'sleep 3; /var/www/bin/screen_off_and_shutdown.sh'}
 }
+# Live readings
+live_shm = os.environ.get('PICKLE_RAMDISK', '/mnt/ramdisk') + '/LIVE.shm'  # PickleRecorder publishes every sample here
+data_dir = os.environ.get('PICKLE_DATA_DIR', '/var/www/html/data')
+current_log = data_dir + '/current'  # or we read the end of its log
+live_readings = data_dir + '/live_readings'  # the recorder logs every sample while it's there
+live_poll_time = 0.05  # seconds; a frame is only drawn when a new sample is in
+idle_wait = 1.0  # seconds; with nothing live to draw, we only wake for a button or a Timing dump
+button_bounce_ms = 300
+LIVE_SHM = None
+LAST_SEQUENCE = None
+PRESSES = queue.Queue()  # button pins, put there by the GPIO library's thread
+
 options_map = {  # key is the vertical position
     40: '    Restart WiFi ->',
     100: 'Restart Recorder ->',
@@ -36,153 +50,321 @@ options_map = {  # key is the vertical position
     220: 'Shutdown picklePi->'
 }
 
+# The TFT is mounted upside down. Screens are laid out upright here, but drawn
+#  upside down: the static parts are pre-rendered (and rotated once), and each
+#  live value is drawn from rotated glyphs into its own spot, so only the
+#  values that changed are repainted and pushed to the display.
+SCREEN_SIZE = (320, 240)
+live_rows = (  # (label, reading) for the left and right half of each row; see Decoder.Readings
+    (('MPH:', 'mph'), ('RPM:', 'rpm')),
+    (('AFR:', 'afr'), ('MAP:', 'map')),
+    (('FtRPM:', 'fRpm'), ('RrRPM:', 'rRpm')),
+    (('FuelT:', 'ftemp'), ('FuelP:', 'fpress')),
+    (('LRideH:', 'lrh'), ('RRideH:', 'rrh')),
+)
+egt_header = 'EGT1   EGT2  EGT3   EGT4'
+egt_names = ('egt1', 'egt2', 'egt3', 'egt4')
+# the options screen from an earlier start; a new one is saved if its text changes
+splash_path = '/var/tmp/pickle-options-%08x.bmp' % zlib.crc32(repr((sorted(options_map.items()),
+                                                                    SCREEN_SIZE)).encode())
+SCREEN = None        # what's on the display: 'options', 'live' or None
+OPTIONS_SCREEN = LIVE_SCREEN = None  # pre-rendered, upside down
+FONTS = {}           # size -> font, loaded when first wanted
+VALUE_RECTS = {}     # reading name -> where its value goes, upside down
+LIVE_VALUES = {}     # reading name -> the text on the display now
+GLYPHS = {}          # character -> upside-down surface
+
 
 def ctl_reading(action):  # 'toggle' is the only action value
     global get_live_reading
     try:
         if get_live_reading:
-            os.system('rm -f /var/www/html/data/live_readings')
+            os.system('rm -f ' + live_readings)
             get_live_reading = False
         else:
-            os.system('touch /var/www/html/data/live_readings')
+            os.system('touch ' + live_readings)
             get_live_reading = True
     except:
         print('ctl_reading: error... of some sort')
 
 
-def paint_row(text, row_center):
-    text_surface = font_36.render(text, True, BLACK)
-    rect = text_surface.get_rect(center=(160, row_center))
-    lcd.blit(text_surface, rect)
+# where an upright rect ends up once the screen is turned over
+def flipped(rect):
+    return pygame.Rect(SCREEN_SIZE[0] - rect.right, SCREEN_SIZE[1] - rect.bottom,
+                       rect.width, rect.height)
+
+
+def font(size):
+    if size not in FONTS:
+        if not pygame.font.get_init():
+            pygame.font.init()
+        FONTS[size] = pygame.font.Font(None, size)
+    return FONTS[size]
+
+
+def paint_centered(surface, text, font, color, center):
+    text_surface = font.render(text, True, color)
+    surface.blit(text_surface, text_surface.get_rect(center=center))
+
+
+def render_options():
+    global OPTIONS_SCREEN
+    options = pygame.Surface(SCREEN_SIZE)
+    options.fill(WHITE)
+    for (VERT_CENTER, MESSAGE) in options_map.items():
+        paint_centered(options, MESSAGE, font(30), BLACK, (160, VERT_CENTER))
+    OPTIONS_SCREEN = pygame.transform.rotate(options, 180)
+
+
+def render_live():
+    global LIVE_SCREEN
+    # we have seven rows, in 240 pixels total.
+    live = pygame.Surface(SCREEN_SIZE)
+    live.fill(CYAN)
+    row_increment = 36
+    value_height = font(36).get_height()
+    row_center = row_increment // 2  # the offset from the top of the display
+    for row in live_rows:
+        for (half, (label, name)) in enumerate(row):
+            left = 6 + half * 160
+            label_surface = font(36).render(label, True, BLACK)
+            live.blit(label_surface, label_surface.get_rect(midleft=(left, row_center)))
+            value_left = left + label_surface.get_width() + 6
+            value_rect = pygame.Rect(value_left, row_center - value_height // 2,
+                                     (half + 1) * 160 - 2 - value_left, value_height)
+            VALUE_RECTS[name] = flipped(value_rect)
+        row_center = row_center + row_increment
+    paint_centered(live, egt_header, font(33), BLACK, (160, row_center))
+    row_center = row_center + row_increment - 8
+    for (column, name) in enumerate(egt_names):
+        value_rect = pygame.Rect(column * 80 + 12, row_center - value_height // 2, 68, value_height)
+        VALUE_RECTS[name] = flipped(value_rect)
+    LIVE_SCREEN = pygame.transform.rotate(live, 180)
+
+
+def glyph(char):
+    if char not in GLYPHS:
+        GLYPHS[char] = pygame.transform.rotate(font(36).render(char, True, BLACK), 180)
+    return GLYPHS[char]
 
 
-def paint_row_with_font(text, font, row_center):
-    text_surface = font.render(text, True, BLACK)
-    rect = text_surface.get_rect(center=(160, row_center))
-    lcd.blit(text_surface, rect)
+# upright text runs left to right from the left edge of its spot, so upside
+#  down it runs right to left from the right edge. Returns the rect to update.
+def paint_value(name, text):
+    if LIVE_VALUES.get(name) == text:
+        return None
+    LIVE_VALUES[name] = text
+    rect = VALUE_RECTS[name]
+    lcd.blit(LIVE_SCREEN, rect, rect)  # wipe the old value
+    x = rect.right
+    for char in text:
+        char_surface = glyph(char)
+        x -= char_surface.get_width()
+        if x < rect.left:
+            break  # too long for its spot
+        lcd.blit(char_surface, (x, rect.top))
+    return rect
+
+
+def show_message(color, words):
+    global SCREEN
+    lcd.fill(color)
+    text_surface = pygame.transform.rotate(font(40).render(words, True, WHITE), 180)
+    lcd.blit(text_surface, text_surface.get_rect(center=(160, 120)))  # the center flips onto itself
+    pygame.display.update()
+    SCREEN = None
+
+
+# the last line of a log, without reading the whole file; the log's size
+#  stands in for a sequence number. (None, None) when there is no log: the
+#  recorder removes 'current' between runs.
+def tail_line(path):
+    try:
+        with open(path, 'rb') as log:
+            size = log.seek(0, os.SEEK_END)
+            log.seek(max(0, size - 1024))
+            lines = log.read().splitlines()
+    except FileNotFoundError:
+        return (None, None)
+    if lines:
+        return (('tail', size), lines[-1].decode('ascii'))
+    return (('tail', size), '')
+
+
+# The recorder's shared record of its latest sample is a memory read, and its
+#  sequence number tells us whether there's anything new to draw. If there's
+#  no record, stay independent of the PickleRecorder and tail its output file.
+#  A raw line has 41 elements separated by commas, and nanoMicros when streaming
+def latest_raw_line():
+    global LIVE_SHM
+    if LIVE_SHM is None:
+        LIVE_SHM = SharedRecord.attach(live_shm)
+    if LIVE_SHM is not None:
+        record = SharedRecord.fetch(LIVE_SHM)
+        if record is not None:
+            return (record[0], record[3].decode('ascii'))
+    return tail_line(current_log)
+
+
+# the first time live read is wanted: the decoder, the shared record and the live screen
+def start_live():
+    global Decoder, SharedRecord
+    if LIVE_SCREEN is None:
+        import Decoder
+        import SharedRecord
+        render_live()
 
 
-# try to be independent of the PickleRecorder, just tail its output file.
-#  The raw file has 29 elements separated by commas
 def show_live_reading():
+    global LAST_SEQUENCE, SCREEN
     try:
+        start_live()
         # grab the voltages, etc.
-        raw_data_line = subprocess.check_output(
-            'tail -1 /var/www/html/data/current', shell=True)
+        (sequence, raw_data_line) = latest_raw_line()
+        if SCREEN != 'live':
+            lcd.blit(LIVE_SCREEN, (0, 0))
+            pygame.display.update()
+            LIVE_VALUES.clear()
+            LAST_SEQUENCE = None
+            SCREEN = 'live'
+        if raw_data_line is None:
+            return  # nothing being recorded, and no shared record; nothing to show
+        if sequence == LAST_SEQUENCE:
+            return  # the screen already shows this sample
+        LAST_SEQUENCE = sequence
         # Decoder returns 15 values we can show
-        (mph, fRpm, rRpm, afr, man, ftemp, fpress, lrh, rrh, utc,
-         rpm, egt1, egt2, egt3, egt4) = Decoder.get_readings(raw_data_line).split(',')
-
-        lcd.fill(CYAN)
-        # we have six rows, in 240 pixels total.
-        row_increment = 36
-        row_center = row_increment / 2  # the offset from the top of the display
-
-        row1 = ' MPH: ' + str(mph)      + '    RPM: ' + str(rpm) + ' '
-        row2 = ' AFR: ' + str(afr)      + '    MAP: ' + str(man) + ' '
-        row3 = ' FtRPM: ' + str(fRpm)   + '    RrRPM: ' + str(rRpm) + ' '
-        row4 = ' FuelT: ' + str(ftemp)  + '    FuelP: ' + str(fpress) + ' '
-        row4b ='LRideH: ' + str(lrh)    + '   RRideH: ' + str(rrh) + ' '
-        row5 = 'EGT1   EGT2  EGT3   EGT4'
-        row6 = ' ' + str(egt1) + '    ' + str(egt2) + '    ' + str(egt3) + '    ' + str(egt4) + ' '
-
-        paint_row(row1, row_center)
-        row_center = row_center + row_increment
-        paint_row(row2, row_center)
-        row_center = row_center + row_increment
-        paint_row(row3, row_center)
-        row_center = row_center + row_increment
-        paint_row(row4, row_center)
-        row_center = row_center + row_increment
-        paint_row(row4b, row_center)
-        row_center = row_center + row_increment
-        paint_row_with_font(row5, font_33, row_center)
-        row_center = row_center + row_increment - 8
-        paint_row(row6, row_center)
+        frame_start = Timing.now()
+        readings = Decoder.read_readings(raw_data_line)
+        Timing.record('decode', frame_start)
 
-        lcd.blit(pygame.transform.rotate(lcd, 180), (0, 0))
-        pygame.display.update()
+        dirty = []
+        for name in VALUE_RECTS:
+            rect = paint_value(name, getattr(readings, name))
+            if rect:
+                dirty.append(rect)
+        if dirty:
+            pygame.display.update(dirty)
+        Timing.record('frame', frame_start)  # a new sample to its values on the glass
 
     except Exception as e:  # might be anything...
         print('Error in fetch_reading: ' + str(e))
 
 
-# show the startup
+# show the startup; it only needs painting when something else was up
 def show_options():
-    lcd.fill(WHITE)
-    for (VERT_CENTER, MESSAGE) in options_map.items():
-        text_surface = font_30.render('%s' % MESSAGE, True, BLACK)
-        rect = text_surface.get_rect(center=(160, VERT_CENTER))
-        lcd.blit(text_surface, rect)
-    lcd.blit(pygame.transform.rotate(lcd, 180), (0, 0))
-    pygame.display.update()
+    global SCREEN
+    if SCREEN != 'options':
+        lcd.blit(OPTIONS_SCREEN, (0, 0))
+        pygame.display.update()
+        SCREEN = 'options'
+
+
+# # # STARTUP # # #
+# At power-on the driver should see something at once, so the display comes up
+#  in stages: only pygame's display is started (no sound, joystick...), and the
+#  options screen comes from the bitmap an earlier start saved, which needs no
+#  fonts. Fonts load when first wanted, and the live read machinery when live
+#  read is first turned on; the buttons are set up once the first frame is up.
+def process_age():  # seconds since this process started, or since we were imported
+    try:
+        with open('/proc/self/stat') as f:
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])  # field 22, starttime
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / float(os.sysconf('SC_CLK_TCK'))
+    except (IOError, OSError, ValueError, IndexError):
+        return Timing.now() - IMPORTED
+
+
+def load_splash():
+    global OPTIONS_SCREEN
+    try:
+        OPTIONS_SCREEN = pygame.image.load(splash_path).convert()
+        return
+    except (pygame.error, IOError, OSError):
+        pass  # the first start, or the options changed
+    render_options()
+    try:
+        pygame.image.save(OPTIONS_SCREEN, splash_path)
+    except (pygame.error, IOError, OSError) as e:
+        print('could not save the splash: ' + str(e))
 
 
-# # # MAIN # # #
 # hookup the display for output
-print('initing pygame display')
-os.putenv('SDL_FBDEV', '/dev/fb1')
-pygame.init()
-pygame.mouse.set_visible(False)
-font_30 = pygame.font.Font(None, 30)
-font_33 = pygame.font.Font(None, 33)
-font_36 = pygame.font.Font(None, 36)
-font_40 = pygame.font.Font(None, 40)
-font_50 = pygame.font.Font(None, 50)
-font_60 = pygame.font.Font(None, 60)
-lcd = pygame.display.set_mode((320, 240))
-lcd.fill(BLACK)
-pygame.display.update()
-print('pygame display set')
-
-# Setup the GPIOs as inputs with Pull Ups since the buttons are connected to GND
-GPIO.setmode(GPIO.BCM)
-print(GPIO.RPI_INFO)
-for k in button_map.keys():
-    GPIO.setup(k, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-
-# start out with reading disabled
-get_live_reading = False
-
-# initial display
-show_options()
-
-# loop indefinitely
-while True:
+def init_display():
+    global lcd
+    print('initing pygame display')
+    os.putenv('SDL_FBDEV', '/dev/fb1')
+    pygame.display.init()
+    pygame.mouse.set_visible(False)
+    lcd = pygame.display.set_mode(SCREEN_SIZE)
+    load_splash()
+    show_options()
+    first_frame = Timing.record('first_frame', Timing.now() - process_age())
+    print('pygame display set; first frame %.0f ms after start' % (first_frame * 1000))
+
+
+# runs on the GPIO library's thread; the drawing stays on ours
+def button_pressed(pin):
+    PRESSES.put(pin)
+
+
+def next_press(wait):  # a pressed button's pin, or None after wait seconds
     try:
-        button_pressed = False
-        # Scan the buttons
-        for (BUTTON, DICT) in button_map.items():
-            if GPIO.input(BUTTON) == False:  # when the button is down, its value is False
-                button_pressed = True
-                lcd.fill(DICT['color'])
-                words = DICT['text']
-                text_surface = font_40.render('%s' % words, True, WHITE)
-                rect = text_surface.get_rect(center=(160, 120))
-                lcd.blit(text_surface, rect)
-                lcd.blit(pygame.transform.rotate(lcd, 180), (0, 0))
-                pygame.display.update()
-
-                if 'os_cmd' in DICT:
-                    os.system(DICT['os_cmd'])
-                    if BUTTON == SHUTDOWN:
-                        quit()  # keeps us from re-drawing the options screen
-                else:
-                    ctl_reading(DICT['action'])
-                sleep(1.1)
-
-        if not button_pressed:
+        return PRESSES.get(timeout=wait)
+    except queue.Empty:
+        return None
+
+
+# # # MAIN # # #
+# bench/bench_suite.py imports this module to time frames, without the buttons
+if __name__ == "__main__":
+    Timing.start('display')
+    init_display()
+    Timing.dump()  # the time to first frame, straight away
+
+    import RPi.GPIO as GPIO
+    # Setup the GPIOs as inputs with Pull Ups since the buttons are connected to GND;
+    #  a press pulls the pin down, and the GPIO library calls button_pressed()
+    GPIO.setmode(GPIO.BCM)
+    print(GPIO.RPI_INFO)
+    for k in button_map.keys():
+        GPIO.setup(k, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+        GPIO.add_event_detect(k, GPIO.FALLING, callback=button_pressed, bouncetime=button_bounce_ms)
+
+    # start out with reading disabled
+    get_live_reading = False
+
+    # loop indefinitely
+    while True:
+        try:
+            Timing.maybe_dump()
             if get_live_reading:
                 show_live_reading()
+                BUTTON = next_press(live_poll_time)
             else:
                 show_options()
-            sleep(0.2)
+                BUTTON = next_press(idle_wait)
+            if BUTTON is None:
+                continue
+
+            DICT = button_map[BUTTON]
+            show_message(DICT['color'], DICT['text'])
+            if 'os_cmd' in DICT:
+                os.system(DICT['os_cmd'])
+                if BUTTON == SHUTDOWN:
+                    quit()  # keeps us from re-drawing the options screen
+            else:
+                ctl_reading(DICT['action'])
+            sleep(1.1)
+            while next_press(0) is not None:
+                pass  # presses while the message was up
 
-    except KeyboardInterrupt:
-        print("Quitting on Ctrl-C")
-        break
-    except Exception as e:
-        print('Exception in display loop: ' + str(e))
+        except KeyboardInterrupt:
+            print("Quitting on Ctrl-C")
+            break
+        except Exception as e:
+            print('Exception in display loop: ' + str(e))
 
-# last act of a desperate program
-GPIO.cleanup()
+    # last act of a desperate program
+    GPIO.cleanup()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+
+#  version 2026-10-18
+# Keeps data-X.csv up to date while the recorder writes raw-X.csv, so a run is
+#  decoded the moment the car stops. Once a second it looks at where the current
+#  symlink points and how far that file has grown, and decodes just the whole
+#  lines added since. How far it got goes in a checkpoint file after each
+#  batch, so a restart or a crash picks up where it left off. If the data file
+#  was rewritten meanwhile (the web page decoding it, say), it starts that run
+#  again from the top. When the symlink moves on, the rest of the old run is
+#  decoded first, from the gzipped copy if the recorder has compressed it.
+#  Binary (.bin) raw logs are left to Decoder.py.
+#
+# usage: PickleFollower.py [data_dir]
+import gzip
+import json
+import time
+import sys
+import os
+import Decoder
+
+# constants
+data_dir = os.environ.get('PICKLE_DATA_DIR', '/var/www/html/data')
+poll_seconds = 1.0
+read_size = 1024 * 1024  # raw bytes decoded at a time when catching up
+
+
+def checkpoint_path():
+    return os.path.join(data_dir, 'follower.json')
+
+
+def load_checkpoint():  # the run being followed, or None
+    try:
+        with open(checkpoint_path()) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def save_checkpoint(state):  # replaced whole, so a crash leaves the old one or the new one
+    with open(checkpoint_path() + '.tmp', 'w') as f:
+        json.dump(state, f)
+    os.replace(checkpoint_path() + '.tmp', checkpoint_path())
+
+
+def current_raw_log():  # the raw csv the recorder is writing, or None between runs
+    current_symlink = os.path.join(data_dir, 'current')
+    if not os.path.islink(current_symlink):
+        return None
+    raw_path = os.path.realpath(current_symlink)
+    if not raw_path.endswith('.csv'):
+        return None
+    return raw_path
+
+
+def new_state(raw_path):
+    return {'raw': raw_path, 'offset': 0, 'data_size': 0, 'data_inode': None}
+
+
+# the data file to append to, as the checkpoint left it. Lines written after the
+#  last checkpoint are cut off (they'll be decoded again); a data file that isn't
+#  the one we were writing means starting over.
+def prepare_data_file(state):
+    data_path = Decoder.data_path_for(state['raw'])
+    try:
+        st = os.stat(data_path)
+    except OSError:
+        st = None
+    if (state['offset'] > 0 and st is not None and st.st_ino == state['data_inode']
+            and st.st_size >= state['data_size']):
+        if st.st_size > state['data_size']:
+            os.truncate(data_path, state['data_size'])
+        return data_path
+    with open(data_path, 'w') as data_file:
+        data_file.write(Decoder.data_header + '\n')
+    st = os.stat(data_path)
+    state.update({'offset': 0, 'data_size': st.st_size, 'data_inode': st.st_ino})
+    return data_path
+
+
+def read_new(state):  # the raw bytes past the offset, up to read_size
+    raw_path = state['raw']
+    if os.path.isfile(raw_path):
+        if os.path.getsize(raw_path) <= state['offset']:
+            return b''
+        raw_file = open(raw_path, 'rb')
+    else:
+        raw_file = gzip.open(raw_path + '.gz', 'rb')  # the recorder compressed the finished run
+    with raw_file:
+        raw_file.seek(state['offset'])
+        return raw_file.read(read_size)
+
+
+# decodes the next batch of whole lines; False once there are none
+def follow_once(state):
+    data_path = prepare_data_file(state)
+    new_bytes = read_new(state)
+    end = new_bytes.rfind(b'\n') + 1
+    if end == 0:
+        return False  # nothing new, or a line still being written
+    # all epoch times will start with '1'
+    chunk = [line.rstrip() for line in new_bytes[:end].decode('ascii', 'replace').splitlines()
+             if line.startswith('1')]
+    if chunk:
+        with open(data_path, 'a') as data_file:
+            data_file.write('\n'.join(Decoder.decode_lines(chunk)) + '\n')
+    state['offset'] += end
+    state['data_size'] = os.path.getsize(data_path)
+    save_checkpoint(state)
+    return True
+
+
+def finish(state):
+    while follow_once(state):
+        pass
+    print('Finished ' + Decoder.data_path_for(state['raw']) + ' at ' + str(state['offset']) + ' raw bytes')
+    os.remove(checkpoint_path())
+
+
+def follow():
+    state = load_checkpoint()
+    if state:
+        print('Resuming ' + state['raw'] + ' at ' + str(state['offset']) + ' raw bytes')
+    while True:
+        try:
+            current = current_raw_log()
+            if state and state['raw'] != current:
+                if os.path.isfile(state['raw']) or os.path.isfile(state['raw'] + '.gz'):
+                    finish(state)
+                else:
+                    os.remove(checkpoint_path())  # the run is gone; nothing to finish
+                state = None
+            if state is None and current:
+                state = new_state(current)
+                print('Following ' + current)
+            if state:
+                while follow_once(state):
+                    pass
+        except KeyboardInterrupt:
+            print('\nShutting down')
+            break
+        except Exception as e:
+            print('exception in follow: ' + str(e))
+        try:
+            time.sleep(poll_seconds)
+        except KeyboardInterrupt:
+            print('\nShutting down')
+            break
+
+
+# # # # #  MAIN # # # #
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        data_dir = sys.argv[1]
+    follow()
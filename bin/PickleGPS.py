@@ -1,23 +1,43 @@
 #!/usr/bin/python3
 
-#  version 2021-08-02
+#  version 2026-10-18
 #  We write a STATUS file and a POSITION on a ramdisk
-#   STATUS is writen every time a message comes in, POSITION only if the message
-#   is a 'TPV'.
+#   POSITION is rewritten for each 'TPV' (a fix). STATUS sums up what gpsd has
+#   been sending, once per status_interval however many messages come in.
+#  Each POSITION line also goes into POSITION.shm, a SharedRecord the recorder
+#   reads without opening a file, with the fix quality after it (fix_header).
+#   POSITION stays at five fields for setSystemTime.sh and friends.
+#  Only TPV (fixes) and SKY (satellites) messages are looked at. The last
+#   fix_ring_size fixes, each with its quality, are kept in a ring and written
+#   to GPS_FIXES.json along with the STATUS.
 #
+from collections import deque
 from datetime import datetime
+import json
 import time
 import os
 import gps
+import SharedRecord
 
 # constants
-data_dir = '/mnt/ramdisk/'
+data_dir = os.environ.get('PICKLE_RAMDISK', '/mnt/ramdisk') + '/'
 gps_header = 'latitude,longitude,altitudeFt,mph,utc'
+fix_header = 'gpsMode,gpsSatellites,gpsEpx,gpsEpy,gpsEps'  # after gps_header in POSITION.shm
+wanted_classes = ('TPV', 'SKY')
+status_interval = 1.0  # seconds between STATUS writes
+fix_ring_size = 120    # two minutes of fixes at gpsd's 1 Hz
+
+# globals
+FIXES = deque(maxlen=fix_ring_size)  # the latest fixes, newest last
+SEEN = {}  # message class -> count since the last STATUS
+SATELLITES = {'used': '', 'seen': ''}  # from the latest SKY
+LAST_STATUS = 0.0
 
 # start files
 POSITION = open(data_dir + 'POSITION', mode='w')
-POSITION.write("0.0,0.0,0,0,unknown\n") 
+POSITION.write("0.0,0.0,0,0,unknown\n")
 POSITION.close()
+POSITION_SHM = SharedRecord.create(data_dir + 'POSITION.shm')
 
 STATUS   = open(data_dir + 'STATUS',   mode='w')
 timestamp = datetime.now().strftime('%s.%f')[:-3]
@@ -38,34 +58,84 @@ def get_session():
       time.sleep(0.4)
   return session
 
+
+def field(report, name, scale=None, digits=None):  # '' if the report hasn't got it
+  if not hasattr(report, name):
+    return ''
+  value = report[name]
+  if scale is not None:
+    value = value * scale
+  if digits is not None:
+    value = round(value, digits)
+  return str(value)
+
+
+def read_sky(report):
+  satellites = report.get('satellites', [])
+  SATELLITES['seen'] = str(report.get('nSat', len(satellites)))
+  SATELLITES['used'] = str(report.get('uSat', len([s for s in satellites if s.get('used')])))
+
+
+def read_tpv(report):
+  lat = field(report, 'lat') or '0'
+  lon = field(report, 'lon') or '0'
+  alt = field(report, 'alt', 3.2808399) or '0'  # alt in meters, we use feet
+  mph = field(report, 'speed', gps.MPS_TO_MPH) or '0'
+  utc = field(report, 'time') or '0'
+  position = lat + ',' + lon + ',' + alt + ',' + mph + ',' + utc
+  # mode: 1 no fix, 2 2D, 3 3D; epx/epy in metres and eps in m/s, 95% confidence
+  quality = (str(report.get('mode', 0)) + ',' + SATELLITES['used'] + ',' + field(report, 'epx', digits=1) +
+             ',' + field(report, 'epy', digits=1) + ',' + field(report, 'eps', digits=2))
+  SharedRecord.publish(POSITION_SHM, (position + ',' + quality).encode('ascii'))
+  POSITION = open(data_dir + 'POSITION', mode='w')
+  POSITION.write(position + "\n")
+  POSITION.close()
+  FIXES.append(dict(zip((gps_header + ',' + fix_header).split(','), (position + ',' + quality).split(','))))
+
+
+# replaced whole, so setSystemTime.sh and the like never read half of it. The
+#  second word is TPV if a fix came in since the last one, as it always was.
+def write_status():
+  global LAST_STATUS
+  LAST_STATUS = time.monotonic()
+  latest = 'none'
+  if SEEN:
+    latest = 'TPV' if 'TPV' in SEEN else max(SEEN, key=SEEN.get)
+  timestamp = datetime.now().strftime('%s.%f')[:-3]
+  line = timestamp + ": " + latest + " " + ' '.join('%s=%d' % item for item in sorted(SEEN.items()))
+  if FIXES:
+    fix = FIXES[-1]
+    line += (' mode=' + fix['gpsMode'] + ' satellites=' + fix['gpsSatellites'] + '/' + SATELLITES['seen'] +
+             ' epx=' + fix['gpsEpx'] + ' epy=' + fix['gpsEpy'] + ' eps=' + fix['gpsEps'])
+  try:
+    with open(data_dir + 'STATUS.tmp', mode='w') as STATUS:
+      STATUS.write(line + "\n")
+    os.replace(data_dir + 'STATUS.tmp', data_dir + 'STATUS')
+    with open(data_dir + 'GPS_FIXES.json.tmp', mode='w') as fixes_file:
+      json.dump(list(FIXES), fixes_file)
+    os.replace(data_dir + 'GPS_FIXES.json.tmp', data_dir + 'GPS_FIXES.json')
+  except Exception as e:
+    print("exception in write_status: " + str(e))
+  SEEN.clear()
+
+
 # grab the gpsd handle
 session = get_session()
 
-# wait for new messages and process each
+# take messages as they come; wake at least once per status_interval for the STATUS
 while True:
   try:
-    lat = lon = alt = mph = utc = 0
-    report = session.next()
-    # update POSITION if we have a new TPV
-    if report['class'] == 'TPV':
-      if hasattr(report, 'lat'):
-        lat = str(report['lat'])
-      if hasattr(report, 'lon'):
-        lon = str(report['lon'])
-      if hasattr(report, 'alt'):
-        alt = str(report['alt'] * 3.2808399) # alt in meters, we use feet
-      if hasattr(report, 'speed'):
-        mph = str(report['speed'] * gps.MPS_TO_MPH)
-      if hasattr(report, 'time'):
-        utc = str(report['time'])
-      POSITION = open(data_dir + 'POSITION', mode='w')
-      POSITION.write(lat + ',' + lon + ',' + alt + ',' + mph + ',' + utc + "\n")
-      POSITION.close()
-
-    STATUS = open(data_dir + 'STATUS',   mode='w')
-    timestamp = datetime.now().strftime('%s.%f')[:-3]
-    STATUS.write(timestamp + ": " + report['class'] + "\n")
-    STATUS.close
+    if session.waiting(status_interval):
+      report = session.next()
+      SEEN[report['class']] = SEEN.get(report['class'], 0) + 1
+      if report['class'] not in wanted_classes:
+        pass  # VERSION, DEVICES, WATCH, ...; only counted
+      elif report['class'] == 'TPV':
+        read_tpv(report)
+      elif report['class'] == 'SKY':
+        read_sky(report)
+    if time.monotonic() - LAST_STATUS >= status_interval:
+      write_status()
 
   except KeyError:
     pass
@@ -75,6 +145,4 @@ while True:
     print("GPSD has terminated")
     session = get_session()
   except Exception as e:
-    print("exception in main loop: " + str(e))      
-    
-
+    print("exception in main loop: " + str(e))
@@ -1,142 +1,184 @@
 #!/usr/bin/python3
 
-#  version 2022-08-12b
+#  version 2026-10-18
 # Basic approach for reporting:
 #  1. Write a logfile with the raw values (RecordValues)
 #  2. Decode the values after the run. (Decode)
+from collections import deque
 from datetime import datetime
 import time
-import serial  # pip3 install pyserial
+import RawLog
+import SerialLink
+import SharedRecord
+import Timing
+import Frames
+import FlagFile
+import LogIndex
+import threading
+import shutil
+import select
+import gzip
+import json
+import sys
 import os
 from pathlib import Path
 
 # constants
-sleep_time = 0.25  # seconds
-# see udev rules for device construction
-nano_dev = '/dev/NANO'  # NANO  connected via rPi USB;
-nano2_dev = '/dev/NANO2'  # NANO2 connected via rPi USB;
-data_dir = '/var/www/html/data'
+sample_hz = 4  # target samples per second; PickleRecorder.py 10 for 10Hz
+# 0 asks the boards for each sample at sample_hz. 10, 20, ... has the boards stream
+#  samples at that rate on their own clocks, see Frames.py; PickleRecorder.py --stream 20
+stream_hz = 0
+# the sketches take up to 90, but 57600 baud carries about 64 of the NANO's ~90 byte samples a second
+max_stream_hz = 60
+usage = 'usage: PickleRecorder.py [samples per second] | --stream <10, 20, ... ' + str(max_stream_hz) + '>'
+try:
+    if len(sys.argv) > 1 and sys.argv[1] == '--stream':
+        stream_hz = int(sys.argv[2])
+        if len(sys.argv) > 3 or stream_hz not in range(10, max_stream_hz + 1, 10):
+            raise ValueError('bad stream rate')
+    elif len(sys.argv) > 1:
+        sample_hz = float(sys.argv[1])
+        if len(sys.argv) > 2 or not sample_hz > 0:
+            raise ValueError('bad sample rate')
+except (IndexError, ValueError):
+    print('Error: ' + usage)
+    sys.exit(1)
+sample_period = 1.0 / sample_hz  # seconds
+# see udev rules for device construction. The PICKLE_* environment variables
+#  point the recorder somewhere else, e.g. at bench/simulator.py's boards
+nano_dev = os.environ.get('PICKLE_NANO_DEV', '/dev/NANO')  # NANO  connected via rPi USB;
+nano2_dev = os.environ.get('PICKLE_NANO2_DEV', '/dev/NANO2')  # NANO2 connected via rPi USB;
+data_dir = os.environ.get('PICKLE_DATA_DIR', '/var/www/html/data')
+ramdisk = os.environ.get('PICKLE_RAMDISK', '/mnt/ramdisk')
 current_symlink = data_dir+'/current'
-file_timestamp = datetime.now().strftime('%Y-%m-%dT%H%M')
-raw_log_file_path = data_dir + '/raw-' + file_timestamp + '.csv'
+# 'csv' is a text line per sample; 'bin' is RawLog's packed records, written in
+#  batches. Turn them back into csv with RawLog.py, or decode them directly.
+#  The display reads live samples from live_shm, so either will do.
+raw_log_format = 'csv'
+# Each run is a raw log of its own, raw-<minute it started>: it opens when we start
+#  moving (or live readings are wanted), and once we've been still for idle_seconds
+#  it is synced to the card and finished, and gzipped if compress_runs is set.
+idle_seconds = 60
+compress_runs = False  # csv runs only; the Decoder and the web page read raw-X.csv.gz too
 live_readings = data_dir+'/live_readings'
-position_file = "/mnt/ramdisk/POSITION"  # written by PickleGPS.py
+position_file = ramdisk + "/POSITION"  # written by PickleGPS.py
+position_shm = ramdisk + "/POSITION.shm"  # the same line, as a SharedRecord
+live_shm = ramdisk + "/LIVE.shm"  # every raw line we sample, for the display
+stats_file = ramdisk + "/RECORDER_STATS"  # read by the display and web page
+stats_interval = 2  # seconds between stats_file updates
 gps_header = 'latitude,longitude,altitudeFt,mph,utc'
+skew_header = 'nanoSkewMillis'  # when NANO2 answered, relative to NANO
+# the sketches send pulse timing after their first 15 and 8 fields; it goes after
+#  the skew, so every column before it stays where it always was. Empty from a
+#  board that doesn't send it.
+nano_field_count = 15
+nano2_field_count = 8
+pulse_header = ('frontPeriodMicros,frontPulseAgeMicros,rearPeriodMicros,rearPulseAgeMicros,'
+                'camPeriodMicros,camPulseAgeMicros')
+stopped_micros = 2000000  # a wheel whose last pulse is older has stopped, as in Decoder
+# PickleGPS.py puts the fix quality after the position in POSITION.shm: gps mode
+#  (1 none, 2 2D, 3 3D), satellites used, and epx/epy (m) and eps (m/s) at 95%.
+#  It goes after the pulse timing; empty when it isn't known (or from the file).
+fix_header = 'gpsMode,gpsSatellites,gpsEpx,gpsEpy,gpsEps'
+no_fix = ',,,,'
+stream_header = 'nanoMicros'  # streaming only: the NANO's micros() at the sample
+serial_timeout = 1  # seconds, same as the pyserial read timeout
+nano2_kept = 16  # streaming: NANO2 samples held for pairing, a few frames' worth
+pair_wait = 0.5  # seconds a NANO sample waits for NANO2's; a frame at 10Hz spans 0.4
 
 # globals
-NANO = NANO2 = 0
-RAW_LOG_FILE = 0
+NANO = NANO2 = None  # SerialLinks
+RAW_HEADER = ''
+RUN = None  # the run being written: its path, file, and how it's going
+LAST_RUN = None  # the summary of the one before
+LIVE_READINGS = None  # a FlagFile watch on live_readings
+SCHEDULE = {'ticks': 0, 'dropped_ticks': 0, 'overruns': 0, 'runs': 0}  # totals since startup
+POSITION_SHM = None
+LIVE_SHM = None
+GPS_AGE = -1  # seconds since PickleGPS last wrote a position; -1 is unknown
 
 ##### FUNCTIONS #############################################
-# initialize serial (UART) connection to arduino
+# serial (UART) connections to the arduinos are SerialLinks; they reconnect themselves
 
 
-def init_nano():
-    global NANO
-    isOpen = False
-    while not isOpen:
-        try:
-            # baud must match what's in the Arduino sketch
-            NANO = serial.Serial(nano_dev, 57600, timeout=1)
-            NANO.close()
-            NANO.open()
-            isOpen = NANO.isOpen()
-        except:
-            print("exception in init_nano")
-            time.sleep(0.33)
-    if isOpen:
-        print('Nano open: ' + NANO.portstr)
-    else:
-        print('Nano not open? How can be?')
+# the board's header line, or default_header if it won't give one
+def get_header(link, default_header):
+    SerialLink.send(link, str('x').encode())  # in case a run before us left it streaming
+    SerialLink.drain(link, SerialLink.settle_seconds)  # clearing out the startup messages, yo
+    header = SerialLink.request(link, str('h').encode(), serial_timeout, SerialLink.header_fields)
+    if header is None:
+        print('no header from ' + link['name'] + ', using ' + default_header)
+        return default_header
+    return header
 
 
 def get_nano_header():
-    global NANO
-    nano_header = '1000,1,1,1,1,1,1,1,1,1,1,1,1,1,1000'
-                    # 1 2 3 4 5 6 7 8 9 0 1 2 3 4 5
-    try:
-        # clearing out the startup messages, yo
-        junk = NANO.read(1000)
-        junk = NANO.read(1000)
-        NANO.write(str('h').encode())
-        nano_header = NANO.readline().decode('ascii').rstrip()
-    except Exception as e:
-        print("exception in get_nano_header: " + str(e))
-    return nano_header
-
-
-def get_raw_nano_data():
-    global NANO
-    raw_nano_data = '1,1,1,1,1,1,1,1,1,1,1,1,1,1,1'
-                   # 1 2 3 4 5 6 7 8 9 0 1 2 3 4 5
-    try:
-        NANO.write(str('d').encode())
-        raw_nano_data = NANO.readline().decode('ascii').rstrip()
-    except Exception as e:
-        print("exception in get_raw_nano_data: " + str(e))
-    return raw_nano_data
-
-
-def init_nano2():
-    global NANO2
-    isOpen = False
-    while not isOpen:
-        try:
-            # baud must match what's in the Arduino sketch
-            NANO2 = serial.Serial(nano2_dev, 57600, timeout=1)
-            NANO2.close()
-            NANO2.open()
-            isOpen = NANO2.isOpen()
-        except:
-            print("exception in init_nano2")
-            time.sleep(0.33)
-    if isOpen:
-        print('Nano2 open: ' + NANO2.portstr)
-    else:
-        print('Nano2 not open? How can be?')
+    return get_header(NANO, '1000,1,1,1,1,1,1,1,1,1,1,1,1,1,1000')
+                                # 1 2 3 4 5 6 7 8 9 0 1 2 3 4 5
 
 
 def get_nano2_header():
-    global NANO2
-    nano2_header = '2000,2,2,2,2,2,2,2000'
-                     # 1 2 3 4 5 6 7 8
-    try:
-        # clearing out the startup messages, yo
-        junk = NANO2.read(1000)
-        junk = NANO2.read(1000)
-        NANO2.write(str('h').encode())
-        nano2_header = NANO2.readline().decode('ascii').rstrip()
-    except Exception as e:
-        print("exception in get_nano2_header: " + str(e))
-    return nano2_header
-
-
-def get_raw_nano2_data():
-    global NANO2
-    raw_nano2_data = '2,2,2,2,2,2,2,2'
-                    # 1 2 3 4 5 6 7 8
-    try:
-        NANO2.write(str('d').encode())
-        raw_nano2_data = NANO2.readline().decode('ascii').rstrip()
-    except Exception as e:
-        print("exception in get_raw_nano2_data: " + str(e))
-    return raw_nano2_data
-
-
+    return get_header(NANO2, '2000,2,2,2,2,2,2,2000')
+                                 # 1 2 3 4 5 6 7 8
+
+
+# Both sketches only look for a command once per delay(100), so asking one board
+#  and then the other waits out two of those. Instead, send 'd' to both and take
+#  each reply as it lands. The arrival times give the skew between the samples.
+# A board that doesn't answer (or isn't there while its link reconnects) leaves
+#  its fields empty; the other board's still go in the log.
+def get_raw_nanos_data():
+    sent = Timing.now()
+    asked = [link for link in (NANO, NANO2) if SerialLink.ask(link, str('d').encode())]
+    replies = SerialLink.collect(asked, serial_timeout, sent=sent)
+    raw_data = {}
+    for link in (NANO, NANO2):
+        if link['name'] in replies:
+            raw_data[link['name']] = replies[link['name']][0]
+        else:
+            raw_data[link['name']] = ',' * (link['field_count'] - 1)
+
+    skew = ''  # unknown unless both boards answered
+    if 'nano' in replies and 'nano2' in replies:
+        skew = str(int(round((replies['nano2'][1] - replies['nano'][1]) * 1000)))
+    return (raw_data['nano'], raw_data['nano2'], skew)
+
+
+# the shared-memory record is a memory read; the POSITION file is the fallback
+def read_position():
+    global POSITION_SHM, GPS_AGE
+    if POSITION_SHM is None:
+        POSITION_SHM = SharedRecord.attach(position_shm)
+    if POSITION_SHM is not None:
+        record = SharedRecord.fetch(POSITION_SHM)
+        if record is not None:
+            GPS_AGE = record[1]
+            return record[3].decode('ascii')
+    if os.stat(position_file).st_size > 0:
+        GPS_AGE = time.time() - os.stat(position_file).st_mtime
+        return Path(position_file).read_text().strip()  # trim trailing whitespace
+    return None
+
+
+# (the gps_header fields, the fix_header fields), from the one read
 def get_gps_data():
     try:
-        if os.stat(position_file).st_size > 0:
-           position = Path(position_file).read_text().strip()  # trim trailing whitespace
-           (latitude,longitude,altitudeFloat,mphFloat,utc) = position.split(',')
+        position = read_position()
+        if position:
+           fields = position.split(',')
+           (latitude,longitude,altitudeFloat,mphFloat,utc) = fields[:5]
            altitudeFt = altitudeFloat.split('.')[0] # truncate the string
            mph = mphFloat.split('.')[0]
-           return latitude + ',' + longitude + ',' + altitudeFt + ',' + mph + ',' + utc
+           fix_data = no_fix
+           if len(fields) == 10:
+               fix_data = ','.join(fields[5:])
+           return (latitude + ',' + longitude + ',' + altitudeFt + ',' + mph + ',' + utc, fix_data)
     except OSError:
         print("No POSITION file found")
     except Exception as e:
         print("exception in get_gps_data: " + str(e))
     # gps_header is defined above as: 'latitude,longitude,altitudeFt,mph,utc'
-    return '0.0,0.0,0,0,unknown' # 5 elements, no newline
+    return ('0.0,0.0,0,0,unknown', no_fix) # 5 elements, no newline; 5 empty
 
 
 def get_wheel_rpm(pulseCount, elapsedMicros):
@@ -150,9 +192,25 @@ def get_wheel_rpm(pulseCount, elapsedMicros):
     return int(pulses_per_minute)  # int throws away the fraction
 
 
+# a window with no pulse in it reads 0 above even at a slow roll; the pulse
+#  timing says the wheel is turning until its last pulse is stopped_micros old
+def get_pulse_rpm(periodMicros, ageMicros):
+    micros_per_minute = 1000000 * 60  # microseconds
+    if periodMicros <= 0 or ageMicros >= stopped_micros:
+        return 0
+    return int(micros_per_minute / max(periodMicros, ageMicros))
+
+
 def get_wheel_rpms(raw_nano_data):
     # millis,frontCount,deltaFrontCount,deltaFrontMicros,rearCount,deltaRearCount,deltaRearMicros,
+    #  ... then frontPeriodMicros,frontPulseAgeMicros,rearPeriodMicros,rearPulseAgeMicros
     nano_data = raw_nano_data.split(',')
+    if nano_data[0] == '':
+        return (0, 0)  # the NANO didn't answer
+    if len(nano_data) >= nano_field_count + 4:
+        fRpm = get_pulse_rpm(int(nano_data[15]), int(nano_data[16]))
+        rRpm = get_pulse_rpm(int(nano_data[17]), int(nano_data[18]))
+        return (fRpm, rRpm)
     deltaFrontCount = int(nano_data[2])
     deltaFrontMicros = int(nano_data[3])
     deltaRearCount = int(nano_data[5])
@@ -162,57 +220,344 @@ def get_wheel_rpms(raw_nano_data):
     return (fRpm, rRpm)
 
 
-def provision_for_live_readings():
-    try:
-        # clear the live reading flag on startup. Only the PickleDisplay sets it.
-        # PickleDisplay will tail the ./current symlink for a raw_data line
-        if os.path.islink(current_symlink):
-            os.remove(current_symlink)
-        os.symlink(raw_log_file_path, current_symlink)
-    except Exception as e:
-        print('Error provisioning for live readings;' + str(e))
+# a board's reply is (its first field_count fields, the pulse timing after them)
+def split_reply(reply, field_count, pulse_count):
+    fields = reply.split(',')
+    pulse = fields[field_count:field_count + pulse_count]
+    if len(pulse) != pulse_count:
+        pulse = [''] * pulse_count
+    return (','.join(fields[:field_count]), ','.join(pulse))
 
 
-##### MAIN MAIN MAIN ###################################
-init_nano()
-init_nano2()
+def build_raw_line(timestamp, raw_nano_data, raw_nano2_data, gps_data, fix_data, skew):
+    (nano_data, nano_pulse) = split_reply(raw_nano_data, nano_field_count, 4)
+    (nano2_data, nano2_pulse) = split_reply(raw_nano2_data, nano2_field_count, 2)
+    return (timestamp + ',' + nano_data + ',' + nano2_data + ',' + gps_data + ',' + skew +
+            ',' + nano_pulse + ',' + nano2_pulse + ',' + fix_data)  # 1+15+8+5+1+6+5=41 elements
 
-# our primary output is a .csv file of raw values. Writing this is Job #1.
-# if this open() fails, we should just die.
-RAW_LOG_FILE = open(raw_log_file_path, mode='w', buffering=1)
-RAW_LOG_FILE.write('timestamp,' + get_nano_header() + ',' +
-                   get_nano2_header() + ',' + gps_header + '\n')
-print('Writing raw log to ' + raw_log_file_path)
 
-# secondary function is providing live data if commanded by the PickleDisplay.
-provision_for_live_readings()
+def new_run_path():
+    path = data_dir + '/raw-' + datetime.now().strftime('%Y-%m-%dT%H%M') + '.' + raw_log_format
+    if os.path.exists(path) or os.path.exists(path + '.gz'):  # a second run in the same minute
+        path = data_dir + '/raw-' + datetime.now().strftime('%Y-%m-%dT%H%M%S') + '.' + raw_log_format
+    return path
 
 
-print('Starting sensor collection loop... Ctrl-C to stop loop')
-while True:
+def open_raw_log():
+    global RUN
+    path = new_run_path()
+    if raw_log_format == 'bin':
+        raw_log_file = RawLog.open_writer(path, RAW_HEADER)
+    else:
+        raw_log_file = open(path, mode='w', buffering=1)
+        raw_log_file.write(RAW_HEADER + '\n')
+    RUN = {'path': path, 'file': raw_log_file, 'samples': 0,
+           'started': time.time(), 'ended': time.time(), 'last_active': time.monotonic()}
+    SCHEDULE['runs'] += 1
+    point_current_symlink(path)
+    print('Writing raw log to ' + path)
+
+
+def write_raw_log(line):
+    if raw_log_format == 'bin':
+        RawLog.write_line(RUN['file'], line)
+    else:
+        RUN['file'].write(line + '\n')
+    RUN['samples'] += 1
+    RUN['ended'] = time.time()
+    RUN['last_active'] = time.monotonic()
+
+
+def close_raw_log():
+    global RUN, LAST_RUN
+    if RUN is None:
+        return
+    if raw_log_format == 'bin':
+        RawLog.close_writer(RUN['file'])  # flushes and syncs
+    else:
+        RUN['file'].flush()
+        os.fsync(RUN['file'].fileno())
+        RUN['file'].close()
+    point_current_symlink(None)
+    LAST_RUN = {'file': os.path.basename(RUN['path']), 'samples': RUN['samples'],
+                'seconds': round(RUN['ended'] - RUN['started'], 1), 'bytes': os.path.getsize(RUN['path'])}
+    print('Finished raw log ' + RUN['path'] + ': ' + str(LAST_RUN['samples']) + ' samples over ' +
+          str(LAST_RUN['seconds']) + 's, ' + str(LAST_RUN['bytes']) + ' bytes')
+    # not in the sampling loop's time; not a daemon, so it finishes if we're stopped
+    if compress_runs and raw_log_format == 'csv':
+        threading.Thread(target=compress_raw_log, args=(RUN['path'],)).start()
+    elif raw_log_format == 'csv':  # so a time window of it is a seek, see LogIndex
+        threading.Thread(target=LogIndex.index_log, args=(RUN['path'],)).start()
+    RUN = None
+
+
+# raw-X.csv becomes raw-X.csv.gz, with the same mtime so a data file decoded
+#  from it still counts as up to date
+def compress_raw_log(path):
+    try:
+        st = os.stat(path)
+        with open(path, 'rb') as raw_file, gzip.open(path + '.gz.tmp', 'wb', compresslevel=6) as gz_file:
+            shutil.copyfileobj(raw_file, gz_file)
+        os.utime(path + '.gz.tmp', (st.st_atime, st.st_mtime))
+        os.replace(path + '.gz.tmp', path + '.gz')
+        os.remove(path)
+        if os.path.exists(LogIndex.index_path(path)):
+            os.remove(LogIndex.index_path(path))  # a gzipped log can't be mapped
+        print('Compressed ' + path + ' to ' + str(os.path.getsize(path + '.gz')) + ' bytes')
+    except Exception as e:
+        print('exception in compress_raw_log: ' + str(e))
+
+
+# publish every sample for the display; only write if we are moving or doing live
+#  readings. The first such sample opens a run, and idle_seconds without one ends it.
+def log_raw_line(raw_line, raw_nano_data, gps_data):
+    SharedRecord.publish(LIVE_SHM, raw_line.encode('ascii', 'replace'))
+    mph = float(gps_data.split(',')[3])
+    (fRpm, rRpm) = get_wheel_rpms(raw_nano_data)
+    if mph > 2 or fRpm > 1 or rRpm > 1 or FlagFile.is_set(LIVE_READINGS):
+        if RUN is None:
+            open_raw_log()
+        write_start = Timing.now()
+        write_raw_log(raw_line)
+        Timing.record('log_write', write_start)
+    elif RUN is not None:
+        if time.monotonic() - RUN['last_active'] >= idle_seconds:
+            close_raw_log()
+        elif raw_log_format == 'bin':
+            RawLog.flush_if_due(RUN['file'])
+
+
+# PickleDisplay reads raw lines from live_shm, or tails the ./current symlink;
+#  it points at the run being written, and is gone between runs
+def point_current_symlink(path):
     try:
-        time.sleep(sleep_time)
-        # example timestamp: 1526430861.829
-        timestamp = datetime.now().strftime('%s.%f')[:-3]
+        if os.path.islink(current_symlink):
+            os.remove(current_symlink)
+        if path:
+            os.symlink(path, current_symlink)
+    except Exception as e:
+        print('Error provisioning for live readings;' + str(e))
 
-        gps_data = get_gps_data()
-        mph = float(gps_data.split(',')[3])
 
-        raw_nano_data = get_raw_nano_data()
-        raw_nano2_data = get_raw_nano2_data()
+# Sampling runs on a fixed grid of monotonic deadlines, so the time spent on GPS
+#  and serial I/O doesn't stretch the period. A tick that starts late runs at once;
+#  if we've fallen a whole period or more behind, the missed ticks are dropped
+#  (and counted) rather than fired back-to-back.
+def wait_for_tick(deadline):
+    delay = deadline - time.monotonic()
+    if delay > 0:
+        time.sleep(delay)
+    return time.monotonic() - deadline  # how late this tick started
+
+
+def next_deadline(deadline):
+    deadline += sample_period
+    behind = time.monotonic() - deadline
+    if behind >= sample_period:
+        missed = int(behind / sample_period)
+        deadline += missed * sample_period
+        SCHEDULE['dropped_ticks'] += missed
+    return deadline
+
+
+def new_stats_window():
+    return {'start': time.monotonic(), 'ticks': 0,
+            'late': 0.0, 'late_max': 0.0, 'serial': 0.0, 'serial_max': 0.0}
+
+
+def record_tick(window, late, work, serial_time):
+    SCHEDULE['ticks'] += 1
+    if work > sample_period:
+        SCHEDULE['overruns'] += 1
+    window['ticks'] += 1
+    window['late'] += late
+    window['late_max'] = max(window['late_max'], late)
+    window['serial'] += serial_time
+    window['serial_max'] = max(window['serial_max'], serial_time)
+
+
+# a small json file on the ramdisk; replaced whole so readers never see half of it
+def write_stats(window):
+    elapsed = time.monotonic() - window['start']
+    ticks = max(window['ticks'], 1)
+    stats = dict(SCHEDULE)
+    stats.update({
+        'updated': round(time.time(), 3),
+        'target_hz': stream_hz or sample_hz,
+        'actual_hz': round(window['ticks'] / elapsed, 2),
+        'late_ms_mean': round(window['late'] * 1000 / ticks, 1),
+        'late_ms_max': round(window['late_max'] * 1000, 1),
+        'serial_ms_mean': round(window['serial'] * 1000 / ticks, 1),
+        'serial_ms_max': round(window['serial_max'] * 1000, 1),
+        'gps_age_s': round(GPS_AGE, 1),
+        'serial': dict((link['name'], SerialLink.status(link)) for link in (NANO, NANO2)),
+        'run': os.path.basename(RUN['path']) if RUN else None,
+        'last_run': LAST_RUN,
+    })
+    try:
+        with open(stats_file + '.tmp', 'w') as f:
+            json.dump(stats, f)
+        os.replace(stats_file + '.tmp', stats_file)
+    except Exception as e:
+        print('exception in write_stats: ' + str(e))
 
-        (fRpm, rRpm) = get_wheel_rpms(raw_nano_data)
 
-        # only write if we are moving or doing live readings
-        if mph > 2 or fRpm > 1 or rRpm > 1 or os.path.isfile(live_readings):
-            RAW_LOG_FILE.write(timestamp + ',' + raw_nano_data +
-                               ',' + raw_nano2_data + ',' + gps_data + '\n') # 1+15+8+5=29 elements
+# the host keeps the time: each tick, ask both boards for a sample
+def poll_samples():
+    print('Starting sensor collection loop at ' + str(sample_hz) + 'Hz... Ctrl-C to stop loop')
+    deadline = time.monotonic()
+    stats_window = new_stats_window()
+    while True:
+        try:
+            late = wait_for_tick(deadline)
+            tick_start = time.monotonic()
+            # example timestamp: 1526430861.829
+            timestamp = datetime.now().strftime('%s.%f')[:-3]
+
+            gps_start = Timing.now()
+            (gps_data, fix_data) = get_gps_data()
+            Timing.record('gps', gps_start)
+
+            serial_start = Timing.now()
+            (raw_nano_data, raw_nano2_data, skew) = get_raw_nanos_data()
+            serial_time = Timing.record('serial', serial_start)
+
+            raw_line = build_raw_line(timestamp, raw_nano_data, raw_nano2_data, gps_data, fix_data, skew)
+            log_raw_line(raw_line, raw_nano_data, gps_data)
+
+            record_tick(stats_window, late, Timing.record('tick', tick_start), serial_time)
+            if time.monotonic() - stats_window['start'] >= stats_interval:
+                write_stats(stats_window)
+                Timing.dump()
+                stats_window = new_stats_window()
+
+        except KeyboardInterrupt:
+            print("\nShutting down")
+            break
+        except Exception as e:
+            print("exception in main loop: " + str(e))
+        deadline = next_deadline(deadline)
+
+
+def start_streaming():
+    rate = str(stream_hz // 10)  # '1'-'9' is 10-90 Hz
+    for link in (NANO, NANO2):
+        link['resume'] = [rate.encode(), str('s').encode()]  # sent again after a reconnect
+        SerialLink.send(link, rate.encode())
+    time.sleep(SerialLink.command_gap)  # the sketches take one command per pass of their loop
+    for link in (NANO, NANO2):
+        SerialLink.send(link, str('s').encode())
+
+
+def stop_streaming():
+    for link in (NANO, NANO2):
+        link['resume'] = []
+        SerialLink.send(link, str('x').encode())
+
+
+# the boards keep the time: every NANO sample makes a line, with the NANO2
+#  sample nearest it in time and the gps position beside it. NANO2's frame may
+#  come in after NANO's, so a sample is held until NANO2 has caught up to it. The timestamp and skew come from
+#  the boards' own micros(), so the host's scheduling doesn't show in them.
+#  While the NANO's link is reconnecting, each NANO2 sample makes the line.
+def nearest_sample(samples, sample_time):  # (its fields, skew in ms) of the one closest to sample_time
+    (nearest_time, _, fields) = min(samples, key=lambda sample: abs(sample[0] - sample_time))
+    return (fields, str(int(round((nearest_time - sample_time) * 1000))))
+
+
+def waiting_for_nano2(sample_time, nano2_samples, now):  # NANO2's samples from then may be on their way
+    if not SerialLink.is_up(NANO2) or now - sample_time > pair_wait:
+        return False
+    return not nano2_samples or nano2_samples[-1][0] < sample_time
+
+
+def stream_samples():
+    print('Starting streamed collection at ' + str(stream_hz) + 'Hz... Ctrl-C to stop loop')
+    readers = {'nano': Frames.new_reader('nano', nano_field_count),
+               'nano2': Frames.new_reader('nano2', nano2_field_count)}
+    no_nano = ',' * (nano_field_count - 1)
+    no_nano2 = ',' * (nano2_field_count - 1)
+    nano2_samples = deque(maxlen=nano2_kept)  # the latest NANO2 samples, newest last
+    pending = deque()  # NANO samples not yet paired
+    start_streaming()
+    stats_window = new_stats_window()
+    while True:
+        try:
+            links = [link for link in (NANO, NANO2) if SerialLink.is_up(link)]
+            readable = []
+            if links:
+                (readable, _, _) = select.select([link['port'] for link in links], [], [], serial_timeout)
+            else:
+                time.sleep(serial_timeout)  # both reconnecting
+            if not readable:
+                print("timeout in stream_samples; no frames for " + str(serial_timeout) + "s")
+            arrived = time.time()
+            lines = []  # (time, micros, NANO fields, NANO2 fields, skew)
+            for link in [link for link in links if link['port'] in readable]:
+                samples = Frames.feed(readers[link['name']], SerialLink.read(link), arrived)
+                if link is NANO:
+                    pending.extend(samples)
+                elif SerialLink.is_up(NANO):
+                    nano2_samples.extend(samples)
+                else:
+                    lines += [(sample_time, '', no_nano, fields, '') for (sample_time, micros, fields) in samples]
+            # a NANO sample waits for NANO2's frame with the samples around it
+            while pending and not waiting_for_nano2(pending[0][0], nano2_samples, arrived):
+                (sample_time, micros, fields) = pending.popleft()
+                if nano2_samples and SerialLink.is_up(NANO2):
+                    lines.append((sample_time, micros, fields) + nearest_sample(nano2_samples, sample_time))
+                else:
+                    lines.append((sample_time, micros, fields, no_nano2, ''))
+            for (sample_time, micros, raw_nano_data, raw_nano2_data, skew) in lines:
+                tick_start = time.monotonic()
+                (gps_data, fix_data) = get_gps_data()
+                raw_line = (build_raw_line('%.3f' % sample_time, raw_nano_data, raw_nano2_data,
+                                           gps_data, fix_data, skew) + ',' + str(micros))  # 42 elements
+                log_raw_line(raw_line, raw_nano_data, gps_data)
+                record_tick(stats_window, 0.0, Timing.record('tick', tick_start), 0.0)
+            for link in links:
+                SerialLink.check_stall(link)
+
+            if time.monotonic() - stats_window['start'] >= stats_interval:
+                SCHEDULE['dropped_frames'] = sum(reader['dropped_frames'] for reader in readers.values())
+                SCHEDULE['corrupt_frames'] = sum(reader['corrupt_frames'] for reader in readers.values())
+                write_stats(stats_window)
+                Timing.dump()
+                stats_window = new_stats_window()
+
+        except KeyboardInterrupt:
+            print("\nShutting down")
+            break
+        except Exception as e:
+            print("exception in stream loop: " + str(e))
+    stop_streaming()
 
-    except KeyboardInterrupt:
-        print("\nShutting down")
-        break
-    except Exception as e:
-        print("exception in main loop: " + str(e))
 
-RAW_LOG_FILE.close()
-print('Finished program, raw_data is in ' + raw_log_file_path)
+##### MAIN MAIN MAIN ###################################
+NANO = SerialLink.new_link('nano', nano_dev, nano_field_count, 4)
+NANO2 = SerialLink.new_link('nano2', nano2_dev, nano2_field_count, 2)
+SerialLink.connect(NANO)
+SerialLink.connect(NANO2)
+
+# the pulse timing columns are named even if a board doesn't send them
+RAW_HEADER = ('timestamp,' + split_reply(get_nano_header(), nano_field_count, 4)[0] + ',' +
+              split_reply(get_nano2_header(), nano2_field_count, 2)[0] + ',' + gps_header + ',' +
+              skew_header + ',' + pulse_header + ',' + fix_header)
+if stream_hz:
+    RAW_HEADER += ',' + stream_header
+
+# our primary output is the raw logs; each run opens one. Writing them is Job #1.
+# if an open() fails, the sampling loop says so and tries again next sample.
+# secondary function is providing live data if commanded by the PickleDisplay.
+point_current_symlink(None)  # nothing is being written yet
+LIVE_READINGS = FlagFile.watch(live_readings)
+LIVE_SHM = SharedRecord.create(live_shm, 1024)
+
+
+Timing.start('recorder')  # the timers go to the ramdisk with the stats
+if stream_hz:
+    stream_samples()
+else:
+    poll_samples()
+close_raw_log()
+print('Finished program, raw logs are in ' + data_dir)
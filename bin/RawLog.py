@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+
+#  version 2026-10-18
+# A compact binary form of the raw log, for PickleRecorder to write instead of
+#  the raw-*.csv text. Each sample is one fixed-width packed record; writes are
+#  gathered up and flushed on a time or size budget rather than once per line.
+#
+# File layout:
+#   PKLRAW1\n
+#   <the csv header line, exactly as the csv raw log would have it>\n
+#   <the struct format of a record>\n
+#   then records, each one tag byte:
+#     B <struct bytes>                   a sample, packed
+#     T <2 byte length> <ascii bytes>    a line that doesn't pack exactly (junk
+#                                        from a serial port, odd gps text...)
+# Reading a file back gives the same csv lines, byte for byte.
+#
+# usage: RawLog.py raw-<timestamp>.bin   writes raw-<timestamp>.csv beside it
+import calendar
+import operator
+import struct
+import re
+import time
+import sys
+import os
+
+# constants
+magic = b'PKLRAW1\n'
+flush_bytes = 64 * 1024  # write to the card once this much is waiting...
+flush_seconds = 2.0      # ...or once the oldest waiting record is this old
+read_size = 64 * 1024
+
+# how each raw column is packed; anything not named here is kept as text
+column_codes = {
+    'timestamp': 'q',  # epoch millis
+    'latitude': 'd', 'longitude': 'd',
+    'altitudeFt': 'h', 'mph': 'h',
+    'utc': 'q',        # epoch millis, or 'unknown'
+    'nanoSkewMillis': 'h',
+    'gpsMode': 'h', 'gpsSatellites': 'h',
+    'gpsEpx': 'i', 'gpsEpy': 'i', 'gpsEps': 'i',  # hundredths of a metre (m/s); see encode_hundredths()
+}
+hundredths_columns = ('gpsEpx', 'gpsEpy', 'gpsEps')
+text_code = '16s'
+# an integer field can also be empty; these stand for that
+empty_values = {'H': 0xFFFF, 'I': 0xFFFFFFFF, 'h': -0x8000, 'i': -0x80000000, 'q': -2 ** 63}
+
+
+def column_code(name):
+    if name in column_codes:
+        return column_codes[name]
+    if name.endswith('Count') or name.startswith('raw'):
+        return 'H'  # arduino unsigned int, and analogRead() 0-1023
+    if name == 'millis' or name.endswith('Micros'):
+        return 'I'  # arduino unsigned long
+    return text_code
+
+
+# # # field encoders and decoders; an encoder raises ValueError if it can't # # #
+def encode_int(code):
+    def encode(field):
+        if field == '':
+            return empty_values[code]
+        return int(field)
+    return encode
+
+
+def decode_int(code):
+    empty = empty_values[code]
+
+    def decode(value):
+        if value == empty:
+            return ''
+        return str(value)
+    return decode
+
+
+def encode_millis(field):  # '1526430861.829'
+    (seconds, millis) = field.split('.')
+    if len(millis) != 3:
+        raise ValueError('not millis: ' + field)
+    return int(seconds) * 1000 + int(millis)
+
+
+def decode_millis(value):
+    return '%d.%03d' % divmod(value, 1000)
+
+
+UTC_CACHE = {}  # the gps time only changes once a second
+
+
+def encode_utc(field):  # '2018-05-27T15:55:43.000Z' or 'unknown'
+    if field == 'unknown':
+        return empty_values['q']
+    if field not in UTC_CACHE:
+        if len(field) != 24 or field[19] != '.' or field[23] != 'Z':
+            raise ValueError('not gps time: ' + field)
+        seconds = calendar.timegm(time.strptime(field[:19], '%Y-%m-%dT%H:%M:%S'))
+        UTC_CACHE.clear()
+        UTC_CACHE[field] = seconds * 1000 + int(field[20:23])
+    return UTC_CACHE[field]
+
+
+def decode_utc(value):
+    if value == empty_values['q']:
+        return 'unknown'
+    (seconds, millis) = divmod(value, 1000)
+    return time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(seconds)) + '.%03dZ' % millis
+
+
+# PickleGPS rounds the error estimates to 1 or 2 places and writes str() of
+#  that, so a count of hundredths gives the same text back: '12.3', '0.35', '5.0'
+def encode_hundredths(field):
+    if field == '':
+        return empty_values['i']
+    value = int(round(float(field) * 100))
+    if decode_hundredths(value) != field:
+        raise ValueError('not hundredths: ' + field)
+    return value
+
+
+def decode_hundredths(value):
+    if value == empty_values['i']:
+        return ''
+    return str(value / 100.0)
+
+
+def encode_text(field):
+    return field.encode('ascii')
+
+
+def decode_text(value):
+    return value.rstrip(b'\0').decode('ascii')
+
+
+def codecs_for(names, codes):
+    encoders = []
+    decoders = []
+    for (name, code) in zip(names, codes):
+        if name == 'timestamp':
+            encoders.append(encode_millis)
+            decoders.append(decode_millis)
+        elif name == 'utc':
+            encoders.append(encode_utc)
+            decoders.append(decode_utc)
+        elif name in hundredths_columns and code == 'i':  # logs from before are '16s' text
+            encoders.append(encode_hundredths)
+            decoders.append(decode_hundredths)
+        elif code == 'd':
+            encoders.append(float)
+            decoders.append(repr)
+        elif code.endswith('s'):
+            encoders.append(encode_text)
+            decoders.append(decode_text)
+        else:
+            encoders.append(encode_int(code))
+            decoders.append(decode_int(code))
+    return (encoders, decoders)
+
+
+# # # # # WRITING # # # # #
+def open_writer(path, header):
+    names = header.split(',')
+    codes = [column_code(name) for name in names]
+    record = struct.Struct('<' + ''.join(codes))
+    (encoders, decoders) = codecs_for(names, codes)
+    raw_file = open(path, mode='wb', buffering=0)
+    raw_file.write(magic + header.encode('ascii') + b'\n' + record.format.encode('ascii') + b'\n')
+    return {'file': raw_file, 'record': record, 'encoders': encoders, 'decoders': decoders,
+            'buffer': bytearray(), 'oldest': None}
+
+
+def pack_line(writer, line):
+    fields = line.split(',')
+    if len(fields) == len(writer['encoders']):
+        try:
+            values = [encode(field) for (encode, field) in zip(writer['encoders'], fields)]
+            packed = writer['record'].pack(*values)
+            # only keep the packed form if it reads back as the very same line
+            if all(decode(value) == field for (decode, value, field)
+                   in zip(writer['decoders'], writer['record'].unpack(packed), fields)):
+                return b'B' + packed
+        except (ValueError, OverflowError, UnicodeError, struct.error):
+            pass
+    text = line.encode('ascii', 'replace')[:0xFFFF]
+    return b'T' + struct.pack('<H', len(text)) + text
+
+
+def write_line(writer, line):  # fed one csv line, no newline
+    if not writer['buffer']:
+        writer['oldest'] = time.monotonic()
+    writer['buffer'] += pack_line(writer, line)
+    flush_if_due(writer)
+
+
+# also worth calling when nothing is being written, so the last records don't linger
+def flush_if_due(writer):
+    if writer['buffer'] and (len(writer['buffer']) >= flush_bytes
+                             or time.monotonic() - writer['oldest'] >= flush_seconds):
+        flush(writer)
+
+
+def flush(writer):
+    if writer['buffer']:
+        writer['file'].write(writer['buffer'])
+        writer['buffer'] = bytearray()
+
+
+def close_writer(writer):
+    flush(writer)
+    os.fsync(writer['file'].fileno())
+    writer['file'].close()
+
+
+# # # # # READING # # # # #
+# yields the csv lines (with newlines), header first. A record cut short at the
+#  end of the file, from a crash or a run still being written, is left out.
+def read_lines(path):
+    with open(path, 'rb') as raw_file:
+        if raw_file.read(len(magic)) != magic:
+            raise ValueError('not a binary raw log: ' + path)
+        header = raw_file.readline().decode('ascii').rstrip('\n')
+        record = struct.Struct(raw_file.readline().decode('ascii').rstrip('\n'))
+        codes = re.findall('[0-9]*[a-zA-Z]', record.format[1:])
+        (encoders, decoders) = codecs_for(header.split(','), codes)
+        # str() does for plain ints and floats; only these columns need their decoder
+        special = [i for (i, decode) in enumerate(decoders)
+                   if decode in (decode_millis, decode_utc, decode_text, decode_hundredths)]
+        empties = tuple(empty_values.get(code) for code in codes)
+        yield header + '\n'
+
+        buffer = b''
+        while True:
+            data = raw_file.read(read_size)
+            if not data:
+                return
+            buffer += data
+            position = 0
+            while position < len(buffer):
+                tag = buffer[position:position + 1]
+                if tag == b'B':
+                    end = position + 1 + record.size
+                    if end > len(buffer):
+                        break
+                    values = record.unpack_from(buffer, position + 1)
+                    fields = list(map(str, values))
+                    for i in special:
+                        fields[i] = decoders[i](values[i])
+                    if any(map(operator.eq, values, empties)):
+                        for (i, value) in enumerate(values):
+                            if value == empties[i]:
+                                fields[i] = decoders[i](value)
+                    yield ','.join(fields) + '\n'
+                elif tag == b'T':
+                    if position + 3 > len(buffer):
+                        break
+                    end = position + 3 + struct.unpack_from('<H', buffer, position + 1)[0]
+                    if end > len(buffer):
+                        break
+                    yield buffer[position + 3:end].decode('ascii') + '\n'
+                else:
+                    raise ValueError('bad record tag in ' + path)
+                position = end
+            buffer = buffer[position:]
+
+
+# # # # #  MAIN # # # #
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print('Error: supply path to binary raw file')
+        sys.exit()
+    bin_file_path = sys.argv[1]
+    if not os.path.isfile(bin_file_path):
+        print('Error: file not found at ' + bin_file_path)
+        sys.exit()
+    if not bin_file_path.endswith('.bin'):
+        print("Error: filename must end in '.bin'. NoGood: " + bin_file_path)
+        sys.exit()
+    csv_file_path = bin_file_path[:-len('.bin')] + '.csv'
+
+    try:
+        with open(csv_file_path, 'w') as csv_file:
+            for line in read_lines(bin_file_path):
+                csv_file.write(line)
+        print('Wrote csv file to: ' + csv_file_path)
+    except Exception as e:
+        print('Exception in main loop: ' + str(e))
+        sys.exit()
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+
+#  version 2026-10-18
+# A catalog of every run, so questions across runs ("which run had the peak
+#  EGT4", "max rear wheel rpm on lap 3") are a query instead of a re-decode.
+#
+# Each raw file is decoded once (the same decoding as Decoder.py) and summed up
+#  into a SQLite file in the data directory:
+#   runs           one row per raw file: samples, start, duration, distance, laps
+#   laps           one row per complete lap: start, duration, distance
+#   channel_stats  min/max/mean/p5/p50/p95 of each channel, for the whole run
+#                  (lap 0) and for each lap (1, 2, ...)
+# Laps are counted each time the gps track crosses the start/finish line, a
+#  pair of lat,lon points across the track kept in <data_dir>/start_finish.
+#
+# usage: RunIndex.py [data_dir]                  index the runs that are new or changed
+#        RunIndex.py --line lat1,lon1,lat2,lon2  set the start/finish line (then re-index)
+#        RunIndex.py --sql "select ..."          ask the catalog
+import sqlite3
+import math
+import sys
+import os
+import Decoder
+
+# constants
+data_dir = '/var/www/html/data'
+catalog_name = 'runs.sqlite'
+start_finish_name = 'start_finish'  # one line: lat1,lon1,lat2,lon2
+min_lap_seconds = 20   # crossings closer together than this are the same crossing
+earth_radius_m = 6371000.0
+percentiles = (5, 50, 95)
+# positions in the raw line, see PickleRecorder; Decoder has the others
+COL_TIMESTAMP, COL_LATITUDE, COL_LONGITUDE = 0, 24, 25
+channels = [name for name in Decoder.data_header.split(',') if name != 'utc']
+
+schema = '''
+create table if not exists runs (
+    run text primary key, raw_mtime real, samples integer,
+    start_time real, duration_s real, distance_m real, laps integer);
+create table if not exists laps (
+    run text, lap integer, start_time real, duration_s real, distance_m real,
+    primary key (run, lap));
+create table if not exists channel_stats (
+    run text, lap integer, channel text,
+    min real, max real, mean real, p5 real, p50 real, p95 real,
+    primary key (run, lap, channel));
+create index if not exists channel_stats_by_channel on channel_stats (channel, lap);
+'''
+
+
+def open_catalog(data_dir):
+    catalog = sqlite3.connect(os.path.join(data_dir, catalog_name))
+    catalog.executescript(schema)
+    return catalog
+
+
+def read_start_finish(data_dir):  # ((lat, lon), (lat, lon)), or None if not set
+    try:
+        with open(os.path.join(data_dir, start_finish_name)) as f:
+            values = [float(value) for value in f.read().split(',')]
+        return ((values[0], values[1]), (values[2], values[3]))
+    except (IOError, OSError, ValueError, IndexError):
+        return None
+
+
+# # # # #  GEOMETRY # # # #
+def haversine(lat1, lon1, lat2, lon2):  # metres
+    (phi1, phi2) = (math.radians(lat1), math.radians(lat2))
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * earth_radius_m * math.asin(math.sqrt(a))
+
+
+# which side of the line a->b the point p is on: >0 left, <0 right. Over a
+#  track's few hundred metres lat,lon can be treated as flat.
+def side(a, b, p):
+    return (b[0] - a[0]) * (p[1] - a[1]) - (b[1] - a[1]) * (p[0] - a[0])
+
+
+# does the move from p1 to p2 cross the line segment? A point right on the
+#  line counts as being on its left, so a crossing through it is seen once.
+def crosses(line, p1, p2):
+    (a, b) = line
+    return (((side(a, b, p1) >= 0) != (side(a, b, p2) >= 0)) and
+            ((side(p1, p2, a) >= 0) != (side(p1, p2, b) >= 0)))
+
+
+# # # # #  READING A RUN # # # #
+def position(fields):  # (lat, lon), or None without a fix
+    try:
+        (lat, lon) = (float(fields[COL_LATITUDE]), float(fields[COL_LONGITUDE]))
+    except (IndexError, ValueError):
+        return None
+    if lat == 0 and lon == 0:
+        return None  # PickleGPS writes zeros until it has a fix
+    return (lat, lon)
+
+
+# returns (seconds, positions, {channel: values}); a value that doesn't decode
+#  to a number is None
+def read_run(raw_file_path):
+    seconds = []
+    positions = []
+    values = dict((name, []) for name in channels)
+    lines = Decoder.raw_lines(raw_file_path)
+    chunk = []
+    for line in lines:
+        if line.startswith('1'):  # all epoch times will start with '1'
+            chunk.append(line.rstrip())
+        if len(chunk) >= Decoder.batch_size:
+            add_chunk(chunk, seconds, positions, values)
+            chunk = []
+    if chunk:
+        add_chunk(chunk, seconds, positions, values)
+    if hasattr(lines, 'close'):
+        lines.close()
+    return (seconds, positions, values)
+
+
+def number(field):  # None if it doesn't decode to a number
+    try:
+        return float(field)
+    except ValueError:
+        return None
+
+
+def add_chunk(chunk, seconds, positions, values):
+    for line in chunk:
+        fields = line.split(',')
+        seconds.append(float(fields[COL_TIMESTAMP]))
+        positions.append(position(fields))
+    for (name, column) in zip(Decoder.Readings._fields, Decoder.decode_columns(chunk)):
+        if name in values:
+            values[name].extend(map(number, column))
+
+
+# # # # #  SUMMING UP # # # #
+def distance(positions):
+    metres = 0.0
+    last = None
+    for p in positions:
+        if p is not None:
+            if last is not None:
+                metres += haversine(last[0], last[1], p[0], p[1])
+            last = p
+    return metres
+
+
+def percentile(ordered, percent):  # nearest rank
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100.0))]
+
+
+def channel_summary(values):  # (min, max, mean, p5, p50, p95), or None if nothing decoded
+    ordered = sorted(value for value in values if value is not None)
+    if not ordered:
+        return None
+    return ((ordered[0], ordered[-1], sum(ordered) / len(ordered)) +
+            tuple(percentile(ordered, percent) for percent in percentiles))
+
+
+# sample indexes where the track crosses the start/finish line
+def line_crossings(seconds, positions, line):
+    crossings = []
+    last = None
+    for (i, p) in enumerate(positions):
+        if p is None:
+            continue
+        if last is not None and crosses(line, positions[last], p):
+            if not crossings or seconds[i] - seconds[crossings[-1]] >= min_lap_seconds:
+                crossings.append(i)
+        last = i
+    return crossings
+
+
+def index_run(catalog, raw_file_path, line):
+    run = os.path.basename(raw_file_path)
+    (seconds, positions, values) = read_run(raw_file_path)
+    catalog.execute('delete from runs where run = ?', (run,))
+    catalog.execute('delete from laps where run = ?', (run,))
+    catalog.execute('delete from channel_stats where run = ?', (run,))
+
+    # lap 0 is the whole run; lap n runs from crossing n-1 to crossing n
+    spans = [(0, len(seconds))]
+    if line is not None:
+        crossings = line_crossings(seconds, positions, line)
+        spans += list(zip(crossings, crossings[1:]))
+    for (lap, (first, end)) in enumerate(spans):
+        if lap > 0:
+            catalog.execute('insert into laps values (?, ?, ?, ?, ?)',
+                            (run, lap, seconds[first], seconds[end] - seconds[first],
+                             distance(positions[first:end + 1])))
+        for name in channels:
+            summary = channel_summary(values[name][first:end])
+            if summary:
+                catalog.execute('insert into channel_stats values (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                (run, lap, name) + summary)
+    start_time = duration = None
+    if seconds:
+        (start_time, duration) = (seconds[0], seconds[-1] - seconds[0])
+    catalog.execute('insert into runs values (?, ?, ?, ?, ?, ?, ?)',
+                    (run, os.path.getmtime(raw_file_path), len(seconds), start_time, duration,
+                     distance(positions), len(spans) - 1))
+    catalog.commit()
+    return len(seconds)
+
+
+def index_all(data_dir, reindex=False):
+    catalog = open_catalog(data_dir)
+    line = read_start_finish(data_dir)
+    indexed = dict(catalog.execute('select run, raw_mtime from runs'))
+    raw_file_paths = Decoder.find_raw_files(data_dir)
+    # a run that's gone, or was gzipped into raw-X.csv.gz, leaves the catalog
+    for run in set(indexed).difference(os.path.basename(path) for path in raw_file_paths):
+        for table in ('runs', 'laps', 'channel_stats'):
+            catalog.execute('delete from ' + table + ' where run = ?', (run,))
+    catalog.commit()
+    for raw_file_path in raw_file_paths:
+        run = os.path.basename(raw_file_path)
+        if not reindex and indexed.get(run) == os.path.getmtime(raw_file_path):
+            continue
+        try:
+            samples = index_run(catalog, raw_file_path, line)
+            print('Indexed ' + run + ': ' + str(samples) + ' samples')
+        except Exception as e:
+            catalog.rollback()
+            print('Exception indexing ' + run + ': ' + str(e))
+    catalog.close()
+
+
+# # # # #  MAIN # # # #
+if __name__ == "__main__":
+    if len(sys.argv) >= 3 and sys.argv[1] == '--sql':
+        catalog = open_catalog(data_dir)
+        for row in catalog.execute(sys.argv[2]):
+            print(','.join(str(value) for value in row))
+        sys.exit()
+    if len(sys.argv) >= 3 and sys.argv[1] == '--line':
+        values = sys.argv[2].split(',')
+        if len(values) != 4:
+            print('Error: supply the start/finish line as lat1,lon1,lat2,lon2')
+            sys.exit()
+        with open(os.path.join(data_dir, start_finish_name), 'w') as f:
+            f.write(','.join(values) + '\n')
+        index_all(data_dir, reindex=True)  # every run's laps change
+        sys.exit()
+    if len(sys.argv) > 1:
+        data_dir = sys.argv[1]
+    if not os.path.isdir(data_dir):
+        print('Error: no data directory at ' + data_dir)
+        sys.exit()
+    try:
+        index_all(data_dir)
+    except Exception as e:
+        print('Exception in main loop: ' + str(e))
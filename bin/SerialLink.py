@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+
+#  version 2026-10-18
+# One arduino on a USB serial port, for PickleRecorder. A link keeps its port
+#  open, or gets it back: a read or write that fails, stall_timeouts missed
+#  replies in a row, or stall_seconds of silence while streaming, closes the port,
+#  and a thread reopens it every reconnect_interval while the recorder carries on
+#  with the other board. Once it's back the link sends its 'resume' commands
+#  (streaming's rate and 's') and is used again.
+# A polled reply is only taken if it looks like one: field_count fields, or that
+#  plus pulse_count from newer sketches, each an unsigned number. Anything else
+#  (half a line from before we asked, the sketch's startup message, "Wheel counts
+#  reset.") is counted and passed over, and the next line is tried. Whatever is
+#  waiting from before a request (a late reply) is thrown away first.
+# What went wrong is counted per link; status() is what the recorder's stats show.
+import threading
+import select
+import time
+import serial  # pip3 install pyserial
+import Timing
+
+# constants
+baud = 57600               # must match what's in the Arduino sketch
+reconnect_interval = 0.5   # seconds between tries at reopening a lost port
+settle_seconds = 2.0       # opening the port resets the nano; its startup chatter takes this long
+command_gap = 0.25         # the sketches take one command per pass of their loop
+stall_timeouts = 3         # missed replies in a row before the board is taken to be gone
+stall_seconds = 2.0        # streaming: this long without a byte and it's gone
+max_line = 512             # bytes without a newline before the buffer is thrown away
+error_names = ('timeouts', 'malformed', 'stale', 'read_errors', 'write_errors', 'reconnects')
+
+
+def new_link(name, dev, field_count, pulse_count):
+    link = {'name': name, 'dev': dev, 'field_count': field_count, 'pulse_count': pulse_count,
+            'port': None, 'buffer': b'', 'missed': 0, 'last_read': time.monotonic(),
+            'reconnecting': False, 'resume': []}
+    for error in error_names:
+        link[error] = 0
+    return link
+
+
+def open_port(link):
+    # reads don't wait, writes wait at most a second; select() does the waiting
+    port = serial.Serial(link['dev'], baud, timeout=0, write_timeout=1)
+    if not port.isOpen():
+        raise IOError(link['dev'] + ' did not open')
+    return port
+
+
+def connect(link):  # at startup: wait for the port, however long that takes
+    while True:
+        try:
+            link['port'] = open_port(link)
+            link['last_read'] = time.monotonic()
+            print(link['name'] + ' open: ' + link['port'].portstr)
+            return
+        except Exception as e:
+            print('exception in SerialLink.connect for ' + link['name'] + ': ' + str(e))
+            time.sleep(0.33)
+
+
+def lost(link, why):
+    port = link['port']
+    if port is None:
+        return
+    print(link['name'] + ' lost (' + why + '), reconnecting to ' + link['dev'])
+    (link['port'], link['buffer'], link['missed']) = (None, b'', 0)
+    try:
+        port.close()
+    except Exception:
+        pass
+    if not link['reconnecting']:
+        link['reconnecting'] = True
+        threading.Thread(target=reconnect, args=(link,), daemon=True).start()
+
+
+def reconnect(link):  # in its own thread; the link is unused until port is set
+    while True:
+        port = None
+        try:
+            port = open_port(link)
+            time.sleep(settle_seconds)
+            port.reset_input_buffer()
+            for command in link['resume']:
+                port.write(command)
+                time.sleep(command_gap)
+            break
+        except Exception:
+            if port is not None:
+                port.close()
+            time.sleep(reconnect_interval)
+    link['reconnects'] += 1
+    (link['buffer'], link['missed'], link['last_read']) = (b'', 0, time.monotonic())
+    link['reconnecting'] = False
+    link['port'] = port
+    print(link['name'] + ' back on ' + port.portstr)
+
+
+def is_up(link):
+    return link['port'] is not None
+
+
+def send(link, command):  # False if the board isn't there to send to
+    port = link['port']
+    if port is None:
+        return False
+    try:
+        port.write(command)
+        return True
+    except Exception as e:
+        link['write_errors'] += 1
+        lost(link, 'write: ' + str(e))
+        return False
+
+
+def ask(link, command):  # send, after throwing away anything left from before
+    port = link['port']
+    if port is None:
+        return False
+    try:
+        if link['buffer'] or port.in_waiting:
+            link['stale'] += 1
+            link['buffer'] = b''
+            port.reset_input_buffer()
+    except Exception as e:
+        link['read_errors'] += 1
+        lost(link, 'read: ' + str(e))
+        return False
+    return send(link, command)
+
+
+def read(link):  # the bytes that have arrived; b'' if the port went away
+    port = link['port']
+    if port is None:
+        return b''
+    try:
+        # a board unplugged reads as ready with nothing there; pyserial raises
+        data = port.read(port.in_waiting or 1)
+    except Exception as e:
+        link['read_errors'] += 1
+        lost(link, 'read: ' + str(e))
+        return b''
+    if data:
+        link['last_read'] = time.monotonic()
+    return data
+
+
+def take_lines(link, data):  # the whole lines in the buffer, without their line ends
+    link['buffer'] += data
+    if b'\n' not in link['buffer']:
+        if len(link['buffer']) > max_line:
+            link['buffer'] = b''  # no newline coming; wait for the next one
+            link['malformed'] += 1
+        return []
+    lines = link['buffer'].split(b'\n')
+    link['buffer'] = lines.pop()
+    return [line.rstrip(b'\r') for line in lines]
+
+
+def reply_fields(link, line):  # the reply as text if it looks like one, else None
+    fields = line.split(b',')
+    if len(fields) not in (link['field_count'], link['field_count'] + link['pulse_count']):
+        return None
+    for field in fields:
+        if not field.isdigit():
+            return None
+    return line.decode('ascii')
+
+
+def header_fields(link, line):  # the header is names where a reply has numbers
+    fields = line.split(b',')
+    if len(fields) not in (link['field_count'], link['field_count'] + link['pulse_count']):
+        return None
+    if any(field.isdigit() or not field for field in fields):
+        return None
+    return line.decode('ascii')
+
+
+# waits up to timeout for the first line from each link that check() takes;
+#  returns {name: (text, when it arrived)}. Links that didn't answer count a
+#  timeout, and stall_timeouts of those in a row lose the link. With sent (a
+#  Timing.now()), each board's reply time goes in Timing under its name.
+def collect(links, timeout, check=reply_fields, sent=None):
+    replies = {}
+    waiting = [link for link in links if link['port'] is not None]
+    deadline = time.monotonic() + timeout
+    while waiting:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        ports = dict((id(link['port']), link) for link in waiting)
+        try:
+            (readable, _, _) = select.select([link['port'] for link in waiting], [], [], remaining)
+        except (OSError, ValueError, TypeError) as e:  # a port closed under us
+            for link in waiting:
+                link['read_errors'] += 1
+                lost(link, 'select: ' + str(e))
+            break
+        for port in readable:
+            link = ports[id(port)]
+            for line in take_lines(link, read(link)):
+                text = check(link, line)
+                if text is None:
+                    link['malformed'] += 1
+                    continue
+                replies[link['name']] = (text, time.monotonic())
+                if sent is not None:
+                    Timing.record(link['name'], sent)
+                break
+            if link['name'] in replies or link['port'] is None:
+                waiting.remove(link)
+    for link in links:
+        if link['name'] in replies:
+            link['missed'] = 0
+        elif link['port'] is not None:
+            link['timeouts'] += 1
+            link['missed'] += 1
+            if link['missed'] >= stall_timeouts:
+                lost(link, str(link['missed']) + ' replies missed')
+    return replies
+
+
+def request(link, command, timeout, check=reply_fields):  # the one reply's text, or None
+    if not ask(link, command):
+        return None
+    reply = collect([link], timeout, check)
+    if link['name'] in reply:
+        return reply[link['name']][0]
+    return None
+
+
+def drain(link, seconds):  # throws away whatever the board says for a while
+    until = time.monotonic() + seconds
+    while link['port'] is not None and time.monotonic() < until:
+        try:
+            select.select([link['port']], [], [], until - time.monotonic())
+        except (OSError, ValueError, TypeError):
+            break
+        read(link)
+    link['buffer'] = b''
+
+
+def check_stall(link):  # streaming: silence means the board is gone
+    if link['port'] is not None and time.monotonic() - link['last_read'] > stall_seconds:
+        link['timeouts'] += 1
+        lost(link, 'nothing for ' + str(stall_seconds) + 's')
+
+
+def status(link):
+    counts = dict((error, link[error]) for error in error_names)
+    counts['up'] = link['port'] is not None
+    return counts
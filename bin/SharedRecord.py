@@ -0,0 +1,70 @@
+#  version 2026-10-18
+# One fixed-size record in a memory-mapped file on the ramdisk, written by one
+#  process and read by any number of others without a syscall per read.
+#
+# A sequence counter guards the record (a seqlock): the writer makes it odd,
+#  writes, then makes it even again. A reader copies the record and checks the
+#  counter was even and unchanged across the copy, otherwise it tries again, so
+#  it never sees half of one write and half of another.
+#
+# Layout, little-endian:
+#   0  u32  sequence
+#   4  u32  payload length
+#   8  f64  time.monotonic() of the write (the same clock in every process)
+#  16  f64  time.time() of the write
+#  24  payload bytes
+import mmap
+import struct
+import time
+import os
+
+# constants
+header = struct.Struct('<IIdd')
+default_capacity = 512  # payload bytes
+read_attempts = 20
+
+
+def create(path, capacity=default_capacity):  # for the one writer
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        os.ftruncate(fd, header.size + capacity)
+        return mmap.mmap(fd, header.size + capacity)
+    finally:
+        os.close(fd)  # the mapping keeps the file
+
+
+def attach(path):  # for readers; None until the writer has created the file
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return None
+    try:
+        if os.fstat(fd).st_size < header.size:
+            return None
+        return mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+    finally:
+        os.close(fd)
+
+
+def publish(mm, payload):
+    payload = payload[:len(mm) - header.size]
+    sequence = header.unpack_from(mm, 0)[0] | 1  # odd: a write is under way
+    struct.pack_into('<I', mm, 0, sequence)
+    mm[header.size:header.size + len(payload)] = payload
+    struct.pack_into('<Idd', mm, 4, len(payload), time.monotonic(), time.time())
+    struct.pack_into('<I', mm, 0, (sequence + 1) & 0xFFFFFFFF)
+
+
+# returns (sequence, age in seconds, wall time, payload), or None if nothing has
+#  been written yet or the writer kept getting in the way
+def fetch(mm):
+    for attempt in range(read_attempts):
+        (sequence, length, written, wall_time) = header.unpack_from(mm, 0)
+        if sequence & 1:
+            continue
+        payload = mm[header.size:header.size + length]
+        if header.unpack_from(mm, 0)[0] == sequence:
+            if sequence == 0:
+                return None
+            return (sequence, time.monotonic() - written, wall_time, payload)
+    return None
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+
+#  version 2026-10-18
+# Always-on timing of the hot paths, cheap enough to leave running at the track.
+#  Each timer is a count, a total, a max and a log2 histogram: bucket n counts
+#  the times under 2**n microseconds. That's a fixed 32 slots per timer however
+#  long the session, and recording a time is a few additions.
+# A process calls start('recorder') once, record(name, started) after each timed
+#  piece of work, and dump() (or maybe_dump()) now and then; the timers land in
+#  <ramdisk>/TIMING-recorder.json.
+# With PICKLE_PROFILE=1 in its environment, a process also samples where its cpu
+#  time goes (a signal every few ms of cpu) and dumps the busiest lines with the timers.
+#
+# usage: Timing.py [TIMING-x.json ...]   shows the dumps, all of them by default
+import signal
+import atexit
+import json
+import glob
+import time
+import sys
+import os
+from collections import Counter
+
+# constants
+ramdisk = os.environ.get('PICKLE_RAMDISK', '/mnt/ramdisk')
+bucket_count = 32        # 2**31 us is over half an hour
+dump_interval = 5        # seconds, for maybe_dump()
+profile_interval = 0.005  # seconds of cpu time between profiler samples
+profile_top = 40         # code lines kept in a dump
+
+# globals
+TIMERS = {}  # name -> {'count', 'total', 'max', 'buckets'}
+PROFILE = Counter()  # 'file:function:line' -> samples
+DUMP = {'path': None, 'last': 0.0}
+
+now = time.monotonic
+
+
+def start(process_name):
+    DUMP['path'] = os.path.join(ramdisk, 'TIMING-' + process_name + '.json')
+    DUMP['last'] = now()
+    if os.environ.get('PICKLE_PROFILE'):
+        signal.signal(signal.SIGPROF, profile_sample)
+        signal.setitimer(signal.ITIMER_PROF, profile_interval, profile_interval)
+        atexit.register(signal.setitimer, signal.ITIMER_PROF, 0)  # a SIGPROF at exit would kill us
+
+
+def record(name, started):  # started is an earlier Timing.now(); returns the seconds since
+    elapsed = now() - started
+    timer = TIMERS.get(name)
+    if timer is None:
+        timer = TIMERS[name] = {'count': 0, 'total': 0.0, 'max': 0.0, 'buckets': [0] * bucket_count}
+    timer['count'] += 1
+    timer['total'] += elapsed
+    if elapsed > timer['max']:
+        timer['max'] = elapsed
+    timer['buckets'][min(int(elapsed * 1000000).bit_length(), bucket_count - 1)] += 1
+    return elapsed
+
+
+def profile_sample(signum, frame):
+    if frame is not None:
+        code = frame.f_code
+        PROFILE[os.path.basename(code.co_filename) + ':' + code.co_name + ':' + str(frame.f_lineno)] += 1
+
+
+# the upper edge of the bucket holding that share of the times, in ms
+def percentile_ms(buckets, count, percent):
+    rank = count * percent / 100.0
+    seen = 0
+    for (n, in_bucket) in enumerate(buckets):
+        seen += in_bucket
+        if seen >= rank:
+            return (2 ** n) / 1000.0
+    return (2 ** (bucket_count - 1)) / 1000.0
+
+
+def summary():
+    timers = {}
+    for (name, timer) in TIMERS.items():
+        count = max(timer['count'], 1)
+        timers[name] = {
+            'count': timer['count'],
+            'mean_ms': round(timer['total'] * 1000 / count, 3),
+            'max_ms': round(timer['max'] * 1000, 3),
+            'p50_ms': percentile_ms(timer['buckets'], count, 50),
+            'p99_ms': percentile_ms(timer['buckets'], count, 99),
+            'buckets': timer['buckets'],
+        }
+    result = {'updated': round(time.time(), 3), 'pid': os.getpid(), 'timers': timers}
+    if PROFILE:
+        result['profile_samples'] = sum(PROFILE.values())
+        result['profile'] = PROFILE.most_common(profile_top)
+    return result
+
+
+def dump():  # replaced whole, so a reader never sees half of it
+    if DUMP['path'] is None:
+        return
+    DUMP['last'] = now()
+    try:
+        with open(DUMP['path'] + '.tmp', 'w') as f:
+            json.dump(summary(), f)
+        os.replace(DUMP['path'] + '.tmp', DUMP['path'])
+    except Exception as e:
+        print('exception in Timing.dump: ' + str(e))
+
+
+def maybe_dump():
+    if now() - DUMP['last'] >= dump_interval:
+        dump()
+
+
+# # # # #  MAIN # # # #
+def show(path):
+    with open(path) as f:
+        result = json.load(f)
+    print(os.path.basename(path) + ' (pid ' + str(result['pid']) + ', ' +
+          str(int(time.time() - result['updated'])) + 's ago)')
+    print('  %-12s %9s %9s %9s %9s %9s' % ('timer', 'count', 'mean ms', 'p50 ms', 'p99 ms', 'max ms'))
+    for (name, timer) in sorted(result['timers'].items()):
+        print('  %-12s %9d %9.3f %9.3f %9.3f %9.3f' % (name, timer['count'], timer['mean_ms'],
+                                                      timer['p50_ms'], timer['p99_ms'], timer['max_ms']))
+    if 'profile' in result:
+        total = result['profile_samples']
+        print('  profile, busiest lines:')
+        for (where, samples) in result['profile'][:15]:
+            print('  %5.1f%%  %s' % (samples * 100.0 / total, where))
+
+
+if __name__ == "__main__":
+    paths = sys.argv[1:] or sorted(glob.glob(os.path.join(ramdisk, 'TIMING-*.json')))
+    if not paths:
+        print('No timing dumps in ' + ramdisk)
+    for path in paths:
+        try:
+            show(path)
+        except Exception as e:
+            print('Exception reading ' + path + ': ' + str(e))
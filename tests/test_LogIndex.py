@@ -0,0 +1,79 @@
+#  version 2026-10-18
+# LogIndex.py: time windows of a raw log come out the same as reading it from the top.
+#  python3 -m unittest discover tests   (or pytest)
+import unittest
+import tempfile
+import shutil
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bin'))
+import LogIndex
+
+first_stamp = 1527436542.75
+
+
+def raw_log(path, lines, samples):
+    with open(path, 'w') as f:
+        f.write('timestamp,millis,mph\n')
+        for line in lines:
+            f.write(line + '\n')
+        for i in range(samples):
+            f.write('%.3f,%d,%d\n' % (first_stamp + 0.25 * i, 1000 + 250 * i, i % 90))
+
+
+def stamp(line):
+    try:
+        return float(line.split(b',')[0])
+    except ValueError:
+        return None
+
+
+def lines_between(path, start, end):  # what a window should hold, the slow way
+    with open(path, 'rb') as f:
+        lines = [line for line in f.readlines()[1:] if line.startswith(b'1')]
+    stamps = [stamp(line) for line in lines]
+    first = [i for (i, t) in enumerate(stamps) if t is not None and t >= start] + [len(lines)]
+    last = [i for (i, t) in enumerate(stamps) if t is not None and t >= end] + [len(lines)]
+    return b''.join(lines[first[0]:last[0]])
+
+
+class Windows(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'raw-test.csv')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def window(self, start, end):
+        (window, log) = LogIndex.open_window(self.path, start, end)
+        try:
+            return window.tobytes()
+        finally:
+            window.release()
+            LogIndex.close_log(log)
+
+    def check_windows(self):
+        for (start, end) in ((0, first_stamp + 10), (first_stamp + 60, first_stamp + 61.1),
+                             (first_stamp + 63.9, first_stamp + 200), (first_stamp + 500, first_stamp + 501)):
+            self.assertEqual(self.window(start, end), lines_between(self.path, start, end))
+
+    def test_windows(self):
+        raw_log(self.path, [], 2000)
+        self.check_windows()
+
+    def test_junk_first_line(self):
+        # a write cut short at the top of the log: starts with '1', but no timestamp
+        raw_log(self.path, ['15274\x003,10', '1junk', '1\x00\x00'], 2000)
+        log = LogIndex.open_log(self.path)
+        stamps = list(log['index']['stamps'])
+        LogIndex.close_log(log)
+        self.assertTrue(stamps)
+        self.assertFalse([stamp for stamp in stamps if stamp != stamp], 'nan in the index')
+        self.assertEqual(stamps, sorted(stamps))
+        self.check_windows()
+
+
+if __name__ == "__main__":
+    unittest.main()
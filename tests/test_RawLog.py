@@ -0,0 +1,80 @@
+#  version 2026-10-18
+# RawLog.py: a raw log written as .bin reads back as the same csv lines.
+#  python3 -m unittest discover tests   (or pytest)
+import unittest
+import tempfile
+import random
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bin'))
+import RawLog
+
+header = ('timestamp,millis,frontCount,deltaFrontCount,deltaFrontMicros,rearCount,deltaRearCount,'
+          'deltaRearMicros,rawLeftRideHeight,rawRightRideHeight,rawFuelPressure,rawFuelTemperature,'
+          'rawGearPosition,rawAirFuelRatio,rawManifoldAbsolutePressure,rawExhaustGasTemperature,'
+          'millis,camPositionCount,deltaCamPositionCount,deltaCamPositionMicros,'
+          'rawEGT1,rawEGT2,rawEGT3,rawEGT4,latitude,longitude,altitudeFt,mph,utc,nanoSkewMillis,'
+          'frontPeriodMicros,frontPulseAgeMicros,rearPeriodMicros,rearPulseAgeMicros,'
+          'camPeriodMicros,camPulseAgeMicros,gpsMode,gpsSatellites,gpsEpx,gpsEpy,gpsEps')
+
+
+# a raw line as PickleRecorder writes it, with the fix quality PickleGPS gives
+def raw_line(rng, i):
+    nano = [1000 + 250 * i, i, 1, 230000] + [i, 1, 240000] + [rng.randint(0, 1023) for _ in range(8)]
+    nano2 = [1000 + 250 * i, i, 2, 220000] + [rng.randint(0, 1023) for _ in range(4)]
+    gps = [repr(37 + rng.random()), repr(-122 - rng.random()), str(rng.randint(0, 300)),
+           str(rng.randint(0, 90)), '2018-05-27T15:55:%02d.000Z' % (i % 60)]
+    pulses = [rng.randint(1000, 300000) for _ in range(6)]
+    fix = [str(rng.choice((2, 3))), str(rng.randint(4, 12)), str(round(rng.random() * 40, 1)),
+           str(round(rng.random() * 40, 1)), str(round(rng.random() * 2, 2))]
+    return ','.join(['%.3f' % (1527436542.799 + 0.25 * i)] + [str(v) for v in nano + nano2] + gps +
+                    [str(rng.randint(-20, 20))] + [str(v) for v in pulses] + fix)
+
+
+class RoundTrip(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        for name in os.listdir(self.dir):
+            os.remove(os.path.join(self.dir, name))
+        os.rmdir(self.dir)
+
+    def write(self, lines):
+        path = os.path.join(self.dir, 'raw-test.bin')
+        writer = RawLog.open_writer(path, header)
+        for line in lines:
+            writer['buffer'] += RawLog.pack_line(writer, line)
+        RawLog.close_writer(writer)
+        return path
+
+    def test_fix_values_pack_and_read_back(self):
+        rng = random.Random(5)
+        lines = [raw_line(rng, i) for i in range(500)]
+        lines[7] = lines[7].rsplit(',', 5)[0] + ',1,0,,,'  # no fix: gpsd left the errors out
+        path = self.write(lines)
+        self.assertEqual(list(RawLog.read_lines(path)), [header + '\n'] + [line + '\n' for line in lines])
+
+        writer = RawLog.open_writer(os.path.join(self.dir, 'raw-pack.bin'), header)
+        for line in lines:
+            self.assertEqual(RawLog.pack_line(writer, line)[:1], b'B', line)  # packed, not kept as text
+        RawLog.close_writer(writer)
+        csv_size = len(header) + 1 + sum(len(line) + 1 for line in lines)
+        self.assertLess(os.path.getsize(path), 0.65 * csv_size)
+
+    def test_error_columns(self):
+        for field in ('', '0.0', '5.0', '12.3', '0.35', '1.2', '327.7', '4000.5'):
+            self.assertEqual(RawLog.decode_hundredths(RawLog.encode_hundredths(field)), field)
+        for field in ('1.20', '0.355', 'x'):
+            self.assertRaises(ValueError, RawLog.encode_hundredths, field)
+
+    def test_junk_line_is_kept_as_text(self):
+        rng = random.Random(6)
+        lines = [raw_line(rng, 0), 'Wheel counts reset.', raw_line(rng, 1)[:40]]
+        self.assertEqual(list(RawLog.read_lines(self.write(lines))),
+                         [header + '\n'] + [line + '\n' for line in lines])
+
+
+if __name__ == "__main__":
+    unittest.main()